@@ -1,6 +1,7 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from multiprocessing import Process
+from multiprocessing import Pool
+from binary_engine import generate_automaton_bits
+from ca_render import BINARY_PALETTE, write_png
 
 def generic_rule(rule_number):
     rule_bits = f"{rule_number:08b}"
@@ -27,31 +28,14 @@ def generate_automaton(rule_func, initial_state, steps):
 def run_and_save(rule_number, width=800, steps=300):
     initial_state = np.zeros(width, dtype=int)
     initial_state[width // 2] = 1
-    rule_func = generic_rule(rule_number)
-    automaton = generate_automaton(rule_func, initial_state, steps)
-
-    plt.figure(figsize=(10, 10))
-    plt.imshow(automaton, cmap='binary', interpolation='none', aspect='equal')
-    plt.title(f"Rule {rule_number} Cellular Automaton", pad=20)
-    plt.xticks([])
-    plt.yticks([])
-    plt.tight_layout()
-    plt.subplots_adjust(top=0.88)
-    plt.savefig(f"Rule{rule_number}.png", dpi=400, bbox_inches='tight')
-    plt.close()
+    automaton = generate_automaton_bits(rule_number, initial_state, steps) #packed-bit version of generate_automaton(generic_rule(rule_number), ...)
 
-if __name__ == "__main__":
-    import multiprocessing
+    write_png(f"Rule{rule_number}.png", automaton, BINARY_PALETTE) #one pixel per cell straight from the states, no matplotlib figure
 
+if __name__ == "__main__":
     rules = [30, 90, 110, 126, 22, 4, 45, 54, 73, 135]
-    processes = []
-
-    for rule in rules:
-        p = Process(target=run_and_save, args=(rule,))
-        p.start()
-        processes.append(p)
 
-    for p in processes:
-        p.join()
+    with Pool() as pool: #one worker per core instead of one process per rule
+        pool.map(run_and_save, rules)
     
     print("All automaton images saved.")
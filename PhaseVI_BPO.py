@@ -1,12 +1,10 @@
 
 import tkinter as tk
-from tkinter import ttk
-import matplotlib.pyplot as plt
-from matplotlib.colors import ListedColormap
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import numpy as np
-import random
-import itertools
+from tkinter import messagebox
+from matplotlib.figure import Figure
+import ca_row_editor
+import ca_sim
+import ca_worker
 
 NUM_GENERATIONS = 300
 CA_WIDTH = 500
@@ -31,59 +29,30 @@ These rules are randomly generated at program start using the `generate_rule_set
 and produce deterministic behavior across the full rule set, while still maintaining
 the flavor of the social lens (optimistic/pessimistic/balanced).
 
+With "Resample Rules Every Generation" checked, the weights are kept as probabilities instead
+(ca_sim.stochastic_rule_set): every cell draws its outcome from them again each generation.
+
 This approach allows you to model socioeconomic mobility from different ideological worldviews
 and investigate how structural patterns emerge from simple, interpretable local rules.
 """
-# Generate weighted rule sets based on behavioral models
-def generate_weighted_rule_set(model='balanced'):
-    rules = {}
-    for combo in itertools.product(STATES, repeat=3):
-        if model == 'balanced':
-            weights = [0.3, 0.5, 0.2]  # Mostly stable
-        elif model == 'pessimistic':
-            weights = [0.45, 0.45, 0.1]  # Mostly struggling
-        elif model == 'optimistic':
-            weights = [0.15, 0.5, 0.35]  # Mostly stable/thriving
-        else:
-            weights = [1/3, 1/3, 1/3]  # Equal fallback
-
-        rules[combo] = random.choices(STATES, weights=weights)[0]
-    return rules
-
-# Inheritance and intervention logic (added on top of CA rules)
-def apply_inheritance_and_intervention(left, center, right, base_state):
-    # If most neighbors are thriving and you're not, you might rise
-    if base_state < 2 and (left == 2) + (right == 2) >= 2:
-        return base_state + 1
-    # If you're surrounded by struggle and you're not struggling, you might fall
-    if base_state > 0 and (left == 0) + (right == 0) >= 2:
-        return base_state - 1
-    return base_state
+# Weighted rule sets based on behavioral models live in ca_sim so batch runs can use them without Tk
+from ca_sim import generate_weighted_rule_set
 
 class CAApp:
     def __init__(self, master):
         self.master = master
         master.title("3-State CA: Human Success Simulator (Phase VI)")
 
-        self.cells = [tk.IntVar(value=0) for _ in range(CA_WIDTH)]
-        self.spinboxes = []
-
         # Dropdown to select rule behavior model
         self.rule_logic_choice = tk.StringVar(value="balanced")
         tk.Label(master, text="Rule Set (Behavioral Logic):").pack()
         tk.OptionMenu(master, self.rule_logic_choice, "balanced", "pessimistic", "optimistic").pack()
+        self.stochastic_rules = tk.BooleanVar(value=False)
+        tk.Checkbutton(master, text="Resample Rules Every Generation", variable=self.stochastic_rules).pack()
 
         tk.Label(master, text="Initial Generation (0=Struggling, 1=Stable, 2=Thriving):").pack()
-        self.init_frame = tk.Frame(master)
-        self.init_frame.pack()
-        upper_row = tk.Frame(self.init_frame)
-        lower_row = tk.Frame(self.init_frame)
-        upper_row.pack()
-        lower_row.pack()
-        for i in range(CA_WIDTH):
-            sb = tk.Spinbox(upper_row if i < CA_WIDTH // 2 else lower_row, from_=0, to=2, width=2, textvariable=self.cells[i])
-            sb.pack(side='left')
-            self.spinboxes.append(sb)
+        self.row_editor = ca_row_editor.RowEditor(master, CA_WIDTH) #one canvas backed by a numpy row instead of a Spinbox per cell
+        self.row_editor.pack()
 
         btn_frame = tk.Frame(master)
         btn_frame.pack(pady=5)
@@ -98,89 +67,82 @@ class CAApp:
         tk.Scale(master, from_=0.0, to=0.3, resolution=0.01, orient=tk.HORIZONTAL,
                  variable=self.randomness_level).pack()
 
+        self.seed = tk.StringVar() #blank = fresh seed every run, the seed a run used is shown in its title
+        seed_frame = tk.Frame(master)
+        seed_frame.pack()
+        tk.Label(seed_frame, text="Seed (blank = new):").pack(side='left')
+        tk.Entry(seed_frame, textvariable=self.seed, width=40).pack(side='left')
+
         tk.Button(master, text="Run Simulation", command=self.run_simulation).pack(pady=8)
         self.canvas_frame = tk.Frame(master)
         self.canvas_frame.pack()
+        self.active_run = None
 
     def init_single_center(self):
-        for i, var in enumerate(self.cells):
-            var.set(0)
-        self.cells[CA_WIDTH // 2].set(2)
-
-    def randomize_initial(self):
-        for var in self.cells:
-            var.set(random.choice(STATES))
-
-    def next_state(self, left, center, right, rules):
-        if self.randomness_enabled.get() and random.random() < self.randomness_level.get():
-            return random.choice(STATES)
-        base = rules.get((left, center, right), center)
-        return apply_inheritance_and_intervention(left, center, right, base)
-
-    def evolve(self, initial_row, rules):
-        generations = [initial_row]
-        current = initial_row.copy()
-        for _ in range(NUM_GENERATIONS - 1):
-            next_gen = []
-            for i in range(len(current)):
-                l = current[i - 1] if i > 0 else 0
-                c = current[i]
-                r = current[i + 1] if i < len(current) - 1 else 0
-                next_gen.append(self.next_state(l, c, r, rules))
-            generations.append(next_gen)
-            current = next_gen
-        return generations
-
-    def display_ca(self, generations):
-        arr = np.array(generations)
-        cmap = ListedColormap(['blue', 'gold', 'green'])  # State 0,1,2
-
-        fig, axs = plt.subplots(2, 1, figsize=(12, 8), gridspec_kw={'height_ratios': [4, 1]})
-
-        im = axs[0].imshow(arr, cmap=cmap, interpolation='nearest')
-        axs[0].set_title("3-State Cellular Automaton: Human Success Simulation (Phase V)")
-        axs[0].axis('off')
-
-        # Move the legend outside the plot (top-right corner)
-        from matplotlib.patches import Patch
-        legend_elements = [
-            Patch(facecolor='blue', label='Struggling (0)'),
-            Patch(facecolor='gold', label='Stable (1)'),
-            Patch(facecolor='green', label='Thriving (2)')
-        ]
-        axs[0].legend(handles=legend_elements, loc='center left', bbox_to_anchor=(1.0, 0.5), frameon=False)
+        self.row_editor.single_center(2)
+
+    def randomize_initial(self): #from the seed's initial-row stream, so a typed-in seed also reproduces the row
+        streams = self.run_streams()
+        if streams is not None:
+            self.row_editor.randomize(streams['initial_row'])
+            self.seed.set(str(self.last_seed)) #runs reuse it, so the seed in a run's title also reproduces this row
+
+    def evolve(self, initial_row, rules): #tk variables are read once per run, the whole row is computed at once
+        level = self.randomness_level.get() if self.randomness_enabled.get() else 0.0
+        result = ca_sim.run(initial_row, rules, NUM_GENERATIONS, level, overlay='phase_vi')
+        self.stats = result['stats'] #class counts and mobility gathered while evolving
+        return result['history'].tolist()
+
+    def display_ca(self, stats, fig=None): #charts only, redrawn into the same fig while a run streams in (the CA image is ca_worker's)
+        if fig is None:
+            fig = Figure(figsize=(12, 3))
+        fig.clear()
+        axs = fig.subplots(1, 1, squeeze=False)[:, 0]
 
         # Plot state distribution
-        state_0 = [row.count(0) for row in generations]
-        state_1 = [row.count(1) for row in generations]
-        state_2 = [row.count(2) for row in generations]
-
-        axs[1].plot(state_0, color='blue')
-        axs[1].plot(state_1, color='gold')
-        axs[1].plot(state_2, color='green')
-        axs[1].set_title("State Distribution Over Time")
-        axs[1].set_xlabel("Generation")
-        axs[1].set_ylabel("Count")
-        axs[1].legend(loc='upper right')
-        
+        counts = stats.counts #no extra pass over the rows, see ca_stats
+        state_0, state_1, state_2 = counts[:, 0], counts[:, 1], counts[:, 2]
+
+        axs[0].plot(state_0, color='blue', label='Struggling (0)')
+        axs[0].plot(state_1, color='gold', label='Stable (1)')
+        axs[0].plot(state_2, color='green', label='Thriving (2)')
+        axs[0].set_xlim(0, NUM_GENERATIONS - 1)
+        axs[0].set_title("State Distribution Over Time")
+        axs[0].set_xlabel("Generation")
+        axs[0].set_ylabel("Count")
+        axs[0].legend(loc='upper right')
+
         fig.tight_layout()
         return fig
 
-    def run_simulation(self):
+    def run_streams(self): #rules, initial row and random events each get their own child stream of the run's seed (ca_sim.spawn_streams)
+        try:
+            seed = ca_sim.parse_seed(self.seed.get())
+        except ValueError as error: #a typo must not quietly become a fresh, unreproducible seed
+            messagebox.showerror("Invalid seed", str(error))
+            return None
+        self.last_seed = ca_sim.seed_sequence(seed).entropy
+        return ca_sim.spawn_streams(self.last_seed)
+
+    def run_simulation(self): #the engine runs in a worker thread, image and chart fill in as generations finish (ca_worker)
+        streams = self.run_streams()
+        if streams is None:
+            return
         # Use probabilistic rule generation
-        selected_model = self.rule_logic_choice.get()
-        rules = generate_weighted_rule_set(selected_model)
-
-        init = [var.get() for var in self.cells]
-        generations = self.evolve(init, rules)
-        fig = self.display_ca(generations)
-
-        for widget in self.canvas_frame.winfo_children():
-            widget.destroy()
-
-        canvas = FigureCanvasTkAgg(fig, master=self.canvas_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack()
+        if self.stochastic_rules.get(): #one draw per cell and generation, from the events stream
+            rules = ca_sim.stochastic_rule_set(self.rule_logic_choice.get())
+        else:
+            rules = generate_weighted_rule_set(self.rule_logic_choice.get(), streams['rules'])
+        level = self.randomness_level.get() if self.randomness_enabled.get() else 0.0
+        params = {'initial_row': self.row_editor.get_row(), 'rules': rules, 'generations': NUM_GENERATIONS,
+                  'randomness_level': level, 'overlay': 'phase_vi', 'rng': streams['events']}
+        if self.active_run is not None:
+            self.active_run.detach()
+        self.active_run = ca_worker.ProgressiveRun(self.master, self.canvas_frame, params, f"3-State Cellular Automaton: Human Success Simulation (Phase V) (seed {self.last_seed})",
+                                                   draw_chart=self.display_ca, on_done=self.finish_run)
+
+    def finish_run(self, result):
+        self.stats = result['stats']
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,223 @@
+import argparse
+import datetime
+import importlib
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import binary_engine
+import ca_sim
+import ca_totalistic
+
+"""
+Benchmark harness for every phase's evolve path.
+
+Each benchmark is timed over a matrix of widths, generation counts and randomness levels
+(randomness only for the phases that have random events). A case is run `repeat` times and the
+best wall time is kept; peak memory comes from one extra run under tracemalloc, so tracing does not
+slow the timed runs. The CAApp.evolve methods run headless: the app object is created without
+__init__ (so no window) and given plain stand-ins for its tk variables, and the module's
+NUM_GENERATIONS is set to the case's generation count for the call.
+
+    python ca_bench.py --widths 101 1001 --generations 50 500 --out bench.json
+    python ca_bench.py --out bench.json --baseline bench_baseline.json   # exits 1 on a regression
+
+Results are JSON: one record per case with seconds, cells_per_second (width x generations per
+second) and peak_bytes, plus the Python/NumPy versions. With a baseline, a case whose
+cells_per_second fell by more than the tolerance is reported as a regression.
+"""
+DEFAULT_WIDTHS = (101, 1001)
+DEFAULT_GENERATIONS = (50, 500)
+DEFAULT_RANDOMNESS = (0.0, 0.1)
+DEFAULT_TOLERANCE = 0.25
+PHASE_MODULES = {
+    'II': 'PhaseII_3_state', 'III': 'PhaseIII_StochasticSuccess', 'IV': 'PhaseIV_DeterministicRules',
+    'V': 'PhaseV_InheritanceIntervention', 'VI': 'PhaseVI_BPO',
+}
+
+
+class Value:
+    # Stand-in for a tk variable
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+def center_row(width, state=1):
+    row = np.zeros(width, dtype=int)
+    row[width // 2] = state
+    return row
+
+
+def headless_app(phase, randomness):
+    module = importlib.import_module(PHASE_MODULES[phase])
+    app = module.CAApp.__new__(module.CAApp)
+    app.rules = ca_sim.PHASES[phase]['rules']
+    app.randomness_enabled = Value(randomness > 0)
+    app.randomness_level = Value(randomness)
+    return module, app
+
+
+def phase_evolve(phase):
+    def setup(width, generations, randomness):
+        module, app = headless_app(phase, randomness)
+        row = center_row(width, ca_sim.PHASES[phase]['center_state'])
+        if phase == 'VI':
+            rules = ca_sim.generate_weighted_rule_set('balanced', np.random.default_rng(0))
+            call = lambda: app.evolve(row, rules)
+        else:
+            call = lambda: app.evolve(row)
+
+        def run():
+            saved = module.NUM_GENERATIONS
+            module.NUM_GENERATIONS = generations
+            try:
+                return call()
+            finally:
+                module.NUM_GENERATIONS = saved
+        return run
+    return setup
+
+
+def phase_vi_stochastic(width, generations, randomness):
+    rules = ca_sim.stochastic_rule_set('balanced')
+    row = center_row(width, ca_sim.PHASES['VI']['center_state'])
+    return lambda: ca_sim.run(row, rules, generations, randomness, 'phase_vi', np.random.default_rng(0))
+
+
+def phase_i_loop(width, generations, randomness):
+    phase_i = importlib.import_module('PhaseI_BinaryCA')
+    rule = phase_i.generic_rule(30)
+    return lambda: phase_i.generate_automaton(rule, center_row(width), generations)
+
+
+def phase_i_bits(width, generations, randomness):
+    return lambda: binary_engine.generate_automaton_bits(30, center_row(width), generations)
+
+
+def totalistic_loop(width, generations, randomness):
+    example = importlib.import_module('example3state')
+    rule_map = example.generate_totalistic_direct_rule(1077)
+    return lambda: example.evolve_totalistic_ca(center_row(width), rule_map, generations)
+
+
+def totalistic_batch(width, generations, randomness):
+    tables = ca_totalistic.rule_tables([1077])
+    return lambda: ca_totalistic.evolve_batch(center_row(width), tables, generations)
+
+
+# name -> (setup(width, generations, randomness) -> zero-argument callable, uses randomness)
+BENCHMARKS = {
+    'phase_i.generate_automaton': (phase_i_loop, False),
+    'phase_i.generate_automaton_bits': (phase_i_bits, False),
+    'phase_ii.evolve': (phase_evolve('II'), False),
+    'phase_iii.evolve': (phase_evolve('III'), True),
+    'phase_iv.evolve': (phase_evolve('IV'), True),
+    'phase_v.evolve': (phase_evolve('V'), True),
+    'phase_vi.evolve': (phase_evolve('VI'), True),
+    'phase_vi.stochastic_rules': (phase_vi_stochastic, True),
+    'example3state.evolve_totalistic_ca': (totalistic_loop, False),
+    'ca_totalistic.evolve_batch': (totalistic_batch, False),
+}
+
+
+def cases(names, widths, generations, randomness_levels):
+    for name in names:
+        stochastic = BENCHMARKS[name][1]
+        for width in widths:
+            for gens in generations:
+                for level in (randomness_levels if stochastic else (0.0,)):
+                    yield name, width, gens, level
+
+
+def measure(name, width, generations, randomness, repeat=3):
+    run = BENCHMARKS[name][0](width, generations, randomness)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    seconds = min(times)
+    return {'bench': name, 'width': width, 'generations': generations, 'randomness': randomness,
+            'seconds': seconds, 'cells_per_second': width * generations / seconds if seconds else float('inf'),
+            'peak_bytes': peak}
+
+
+def case_key(record):
+    return record['bench'], record['width'], record['generations'], float(record['randomness'])
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    # (record, baseline record, speed ratio) for every case slower than baseline by more than tolerance
+    previous = {case_key(record): record for record in baseline['results']}
+    regressions = []
+    for record in results:
+        old = previous.get(case_key(record))
+        if old is None:
+            continue
+        ratio = record['cells_per_second'] / old['cells_per_second']
+        if ratio < 1 - tolerance:
+            regressions.append((record, old, ratio))
+    return regressions
+
+
+def run_benchmarks(names=None, widths=DEFAULT_WIDTHS, generations=DEFAULT_GENERATIONS,
+                   randomness_levels=DEFAULT_RANDOMNESS, repeat=3, log=None):
+    results = []
+    for case in cases(names or list(BENCHMARKS), widths, generations, randomness_levels):
+        record = measure(*case, repeat=repeat)
+        results.append(record)
+        if log:
+            log(record)
+    return {'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0], 'numpy': np.__version__, 'platform': platform.platform(),
+            'repeat': repeat, 'results': results}
+
+
+def format_record(record):
+    return (f"{record['bench']:<36} w={record['width']:<6} g={record['generations']:<6} "
+            f"r={record['randomness']:<5} {record['seconds'] * 1000:10.2f} ms "
+            f"{record['cells_per_second'] / 1e6:10.2f} Mcells/s {record['peak_bytes'] / 2 ** 20:8.2f} MiB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every phase's evolve path.")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help="benchmarks to run (default: all)")
+    parser.add_argument('--widths', nargs='+', type=int, default=list(DEFAULT_WIDTHS))
+    parser.add_argument('--generations', nargs='+', type=int, default=list(DEFAULT_GENERATIONS))
+    parser.add_argument('--randomness', nargs='+', type=float, default=list(DEFAULT_RANDOMNESS))
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per case, the best one counts")
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--baseline', help="earlier results to compare against")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed drop in cells/second before a case counts as a regression")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.only, args.widths, args.generations, args.randomness, args.repeat,
+                            log=lambda record: print(format_record(record), flush=True))
+    with open(args.out, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"{len(report['results'])} cases written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(report['results'], json.load(file), args.tolerance)
+        for record, old, ratio in regressions:
+            print(f"REGRESSION {record['bench']} w={record['width']} g={record['generations']} "
+                  f"r={record['randomness']}: {ratio:.2f}x of baseline "
+                  f"({old['cells_per_second'] / 1e6:.2f} -> {record['cells_per_second'] / 1e6:.2f} Mcells/s)")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
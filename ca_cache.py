@@ -0,0 +1,146 @@
+import collections
+import glob
+import hashlib
+import json
+import os
+import numpy as np
+import ca_engine
+import ca_sim
+import ca_stats
+
+"""
+Content-addressed cache of simulation results: an in-memory LRU in front of a directory of .npz files.
+
+A run is keyed by a SHA-256 over its canonical inputs: the compiled 27-entry rule table (so a rules
+dict and its table hit the same entry), the bytes of the initial row, generations, randomness
+level, overlay, cycle handling, and, when random events or stochastic rules are on, the RNG state the
+run starts from. Such runs without a seeded rng cannot be reproduced and are never cached. The key also
+includes ca_engine.ENGINE_VERSION; a cache directory written by another engine version is emptied
+when it is opened.
+
+    cache = ResultCache()
+    params = ca_sim.prepare('VI', seed=7)
+    result = cache.run(**params)     # computed once, later calls come from memory or disk
+
+The directory is bounded by max_bytes: after every store the least recently used files (by mtime,
+touched on every hit) are deleted until it fits again.
+"""
+DEFAULT_DIR = os.environ.get('CA_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'human_success_ca'))
+VERSION_FILE = 'ENGINE_VERSION'
+
+
+def cache_key(initial_row, rules, generations, randomness_level=0.0, overlay=None, rng=None,
+              keep_reasons=False, on_cycle=None):
+    # Hex digest of everything the rows depend on, None when the run cannot be reproduced
+    random = randomness_level > 0 or ca_engine.is_stochastic(rules)
+    if random and rng is None:
+        return None
+    row = ca_engine.as_row(initial_row)
+    inputs = {'engine': ca_engine.ENGINE_VERSION, 'rules': ca_engine.table_digest(rules),
+              'row': hashlib.sha256(row.tobytes()).hexdigest(), 'width': row.shape[-1],
+              'generations': int(generations), 'randomness': float(randomness_level), 'overlay': overlay,
+              'keep_reasons': bool(keep_reasons), 'on_cycle': on_cycle}
+    if random:
+        inputs['rng'] = repr(rng.bit_generator.state)
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=512 * 2 ** 20, max_entries=16):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.memory = collections.OrderedDict()  # key -> result, most recently used last
+        self.hits = self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self.check_version()
+
+    def check_version(self):
+        path = os.path.join(self.directory, VERSION_FILE)
+        version = None
+        if os.path.exists(path):
+            with open(path) as file:
+                version = file.read().strip()
+        if version != str(ca_engine.ENGINE_VERSION):
+            self.clear()
+            with open(path, 'w') as file:
+                file.write(str(ca_engine.ENGINE_VERSION))
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return self.memory[key]
+        path = self.path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        with np.load(path) as data:
+            result = self.from_arrays(data)
+        os.utime(path)  # mtime is the disk LRU clock
+        self.hits += 1
+        self.remember(key, result)
+        return result
+
+    def put(self, key, result):
+        self.remember(key, result)
+        path = self.path(key)
+        tmp = f"{path}.tmp.npz"  # np.savez appends .npz to names without it
+        np.savez(tmp, **self.to_arrays(result))
+        os.replace(tmp, path)
+        self.evict()
+
+    def remember(self, key, result):
+        self.memory[key] = result
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def evict(self):
+        files = [(os.path.getmtime(p), os.path.getsize(p), p) for p in glob.glob(os.path.join(self.directory, '*.npz'))]
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        self.memory.clear()
+        for path in glob.glob(os.path.join(self.directory, '*.npz')):
+            os.remove(path)
+
+    @staticmethod
+    def to_arrays(result):
+        arrays = {'history': result['history'], 'rules': ca_engine.as_rules(result['rules'])}
+        arrays.update({f"stats_{name}": value for name, value in result['stats'].arrays().items()})
+        if 'reasons' in result:
+            arrays['reasons'] = result['reasons']
+        return arrays
+
+    @staticmethod
+    def from_arrays(data):
+        stats = ca_stats.RunStatistics.from_arrays(**{name[len('stats_'):]: data[name]
+                                                      for name in data.files if name.startswith('stats_')})
+        transitions = [dict(zip(ca_engine.REASONS, map(int, c))) for c in stats.reasons]
+        result = {'history': data['history'], 'rules': data['rules'], 'transitions': transitions,
+                  'stats': stats, 'cycle': stats.cycle}
+        if 'reasons' in data.files:
+            result['reasons'] = data['reasons']
+        return result
+
+    def run(self, initial_row, rules, generations, randomness_level=0.0, overlay=None, rng=None,
+            keep_reasons=False, on_cycle=None):
+        # Same arguments and result as ca_sim.run (which does not advance rng either). On a hit
+        # 'rules' is the compiled table.
+        key = cache_key(initial_row, rules, generations, randomness_level, overlay, rng, keep_reasons, on_cycle)
+        result = self.get(key) if key is not None else None
+        if result is None:
+            result = ca_sim.run(initial_row, rules, generations, randomness_level, overlay, rng, keep_reasons,
+                                on_cycle)
+            if key is not None:
+                self.put(key, result)
+        return result
@@ -0,0 +1,133 @@
+import json
+import os
+import numpy as np
+import ca_engine
+import ca_history
+import ca_sim
+import ca_stats
+
+"""
+Checkpoint and resume for long streamed runs.
+
+A Checkpointer sits at the end of the consumer list of ca_sim.stream. Every `every` generations it
+syncs the history files to disk, then atomically replaces the checkpoint file (written next to it,
+fsynced, os.replace) with the state needed to go on: the next generation index, the last row, the
+bit-generator state of the random events, the rule table, the run parameters and the statistics
+so far. A crash therefore always leaves a checkpoint that agrees with rows already on disk.
+
+run_checkpointed starts a run or, if its checkpoint exists, resumes it: the .cahist files are
+truncated back to the checkpoint and appended to, and the rows, reasons and statistics come out
+identical to an uninterrupted run.
+
+    stats = run_checkpointed(ca_sim.prepare('VI', width=100000, generations=50000, seed=1),
+                             'runs/wide.cahist', 'runs/wide.ckpt.npz', every=500)
+"""
+DEFAULT_EVERY = 1000
+
+
+def restore_rng(state):
+    if state is None:
+        return None
+    bit_generator = getattr(np.random, state['bit_generator'])()
+    bit_generator.state = state
+    return np.random.Generator(bit_generator)
+
+
+def save_checkpoint(path, meta, arrays):
+    # Atomic replace: readers see the old checkpoint or the new one, never half of one
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as file:
+        np.savez(file, meta=np.array(json.dumps(meta)), **arrays)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path):
+    with np.load(path) as data:
+        meta = json.loads(str(data['meta']))
+        arrays = {key: data[key] for key in data.files if key != 'meta'}
+    return meta, arrays
+
+
+class Checkpointer:
+    # Stream consumer; put it after the consumers whose state it saves
+    def __init__(self, path, params, stats, writers=(), every=DEFAULT_EVERY):
+        self.path = path
+        self.params = params
+        self.stats = stats
+        self.writers = list(writers)
+        self.every = every
+        self.generation = 0
+        self.row = None
+        self.since = 0
+
+    def update(self, block):
+        if not len(block['rows']):
+            return
+        self.generation = block['start'] + len(block['rows'])
+        self.row = block['rows'][-1]
+        self.since += len(block['rows'])
+        if self.since >= self.every:
+            self.save()
+
+    def close(self):
+        if self.row is not None:
+            self.save()
+
+    def save(self):
+        for writer in self.writers:
+            if not writer.file.closed:  # close() has synced it already
+                writer.flush(sync=True)
+        rng = self.params.get('rng')
+        meta = {'engine_version': ca_engine.ENGINE_VERSION,
+                'generation': self.generation, 'generations': int(self.params['generations']),
+                'randomness_level': float(self.params['randomness_level']), 'overlay': self.params['overlay'],
+                'rng': None if rng is None else rng.bit_generator.state,
+                'histories': {writer.path: writer.generations for writer in self.writers}}
+        arrays = {'row': self.row, 'rules': ca_engine.as_rules(self.params['rules'])}
+        arrays.update({f"stats_{name}": value for name, value in self.stats.arrays().items()})
+        save_checkpoint(self.path, meta, arrays)
+        self.since = 0
+
+
+def check_matches(meta, arrays, params):
+    if meta.get('engine_version') != ca_engine.ENGINE_VERSION:
+        raise ValueError("checkpoint was written by another engine version, its run cannot be continued")
+    same = (np.array_equal(arrays['rules'], ca_engine.as_rules(params['rules']))
+            and meta['generations'] == params['generations'] and meta['overlay'] == params['overlay']
+            and meta['randomness_level'] == float(params['randomness_level'])
+            and len(arrays['row']) == len(params['initial_row']))
+    if not same:
+        raise ValueError("checkpoint was written by a run with different rules or parameters")
+
+
+def run_checkpointed(params, history_path, checkpoint_path, every=DEFAULT_EVERY, reasons_path=None,
+                     block_size=ca_sim.DEFAULT_BLOCK_SIZE, bits=2, consumers=(), profiler=None, **header):
+    # params as from ca_sim.prepare. Returns the ca_stats.RunStatistics of the whole run. Extra
+    # consumers only see the generations computed by this call.
+    params = dict(params)
+    width = len(params['initial_row'])
+    if os.path.exists(checkpoint_path):
+        meta, arrays = load_checkpoint(checkpoint_path)
+        check_matches(meta, arrays, params)
+        start = meta['generation']
+        stats = ca_stats.RunStatistics.from_arrays(**{name[len('stats_'):]: arrays[name]
+                                                      for name in arrays if name.startswith('stats_')})
+        stats.last_row = arrays['row'].copy()
+        writers = [ca_history.HistoryWriter.reopen(path, n) for path, n in meta['histories'].items()]
+        params.update(initial_row=arrays['row'], rng=restore_rng(meta['rng']))
+    else:
+        start = 0
+        stats = ca_stats.RunStatistics()
+        writers = [ca_history.HistoryWriter(history_path, width, bits=bits, rules=params['rules'], **header)]
+        if reasons_path:
+            writers.append(ca_history.HistoryWriter(reasons_path, width, bits=2, key='reasons', **header))
+
+    if start < params['generations']:
+        checkpointer = Checkpointer(checkpoint_path, params, stats, writers, every)
+        blocks = ca_sim.iter_blocks(**params, block_size=block_size, start=start)
+        ca_sim.stream(blocks, writers + [stats] + list(consumers) + [checkpointer], profiler)
+    for writer in writers:
+        writer.close()
+    return stats
@@ -0,0 +1,253 @@
+import io
+import os
+import struct
+import numpy as np
+import ca_history
+
+"""
+Compressed history store (.cadelta): each generation as the cells that changed since the previous
+one, or as run-length segments, with periodic keyframes.
+
+With low randomness most rows differ from the one before in a handful of cells, or are a few long
+runs of one class, so every row is stored as the smallest of three records:
+
+    raw     the row packed 2 bits per cell, as in .cahist
+    runs    run count, run lengths, and the state of each run (2 bits each)
+    diff    count, indices and new states of the cells that differ from the previous row
+
+Rows are grouped into chunks of at most keyframe_every rows. A chunk never starts with a diff
+record, so each chunk decodes on its own. Reading generation t decodes only the chunk holding it,
+up to t. A chunk is written when it is full, on flush() and on close(). A reader sees every
+complete chunk, also while the file is still being written.
+
+Layout:
+    8 bytes    magic b'CADELT1\\n'
+    4 + n      JSON header as in .cahist (width, rules, ...) plus 'encoding' and 'keyframe_every'
+    chunks     uint32 payload bytes, uint32 rows, then one record per row: 1 byte kind + data
+
+Counts, indices and run lengths are uint16 for rows narrower than 65536 cells, else uint32.
+DeltaWriter is a stream consumer like ca_history.HistoryWriter. CompressedHistory keeps the
+same bytes in memory instead of keeping a full (generations, width) array.
+"""
+MAGIC = b'CADELT1\n'
+EXTENSION = '.cadelta'
+DEFAULT_KEYFRAME_EVERY = 256
+RAW, RUNS, DIFF = range(3)  # record kinds
+CHUNK_HEADER = struct.Struct('<II')  # payload bytes, rows
+
+
+def index_dtype(width):
+    return np.dtype('<u2') if width < 2 ** 16 else np.dtype('<u4')
+
+
+def encode_row(row, prev, dtype):
+    # Smallest record for one row; prev is None for the first row of a chunk
+    width = len(row)
+    size = dtype.itemsize
+    best, kind = ca_history.row_bytes(width, 2), RAW
+    starts = np.flatnonzero(row[1:] != row[:-1]) + 1
+    runs = len(starts) + 1
+    if (runs + 1) * size + (runs + 3) // 4 < best:
+        best, kind = (runs + 1) * size + (runs + 3) // 4, RUNS
+    if prev is not None:
+        changed = np.flatnonzero(row != prev)
+        if (len(changed) + 1) * size + (len(changed) + 3) // 4 < best:
+            kind = DIFF
+
+    if kind == RAW:
+        return bytes([RAW]) + ca_history.pack_2bit(row).tobytes()
+    if kind == RUNS:
+        starts = np.concatenate(([0], starts))
+        lengths = np.diff(np.append(starts, width))
+        return (bytes([RUNS]) + np.array([runs], dtype=dtype).tobytes() + lengths.astype(dtype).tobytes()
+                + ca_history.pack_2bit(row[starts]).tobytes())
+    return (bytes([DIFF]) + np.array([len(changed)], dtype=dtype).tobytes() + changed.astype(dtype).tobytes()
+            + ca_history.pack_2bit(row[changed]).tobytes())
+
+
+def decode_chunk(payload, rows, width, dtype, out):
+    # Fills out[:rows] from one chunk's records
+    size = dtype.itemsize
+    raw_bytes = ca_history.row_bytes(width, 2)
+    pos = 0
+    for i in range(rows):
+        kind = payload[pos]
+        pos += 1
+        if kind == RAW:
+            out[i] = ca_history.unpack_2bit(np.frombuffer(payload, np.uint8, raw_bytes, pos), width)
+            pos += raw_bytes
+            continue
+        n = int(np.frombuffer(payload, dtype, 1, pos)[0])
+        positions = np.frombuffer(payload, dtype, n, pos + size)
+        pos += (n + 1) * size
+        states = ca_history.unpack_2bit(np.frombuffer(payload, np.uint8, (n + 3) // 4, pos), n)
+        pos += (n + 3) // 4
+        if kind == RUNS:
+            out[i] = np.repeat(states, positions)
+        elif kind == DIFF and i:
+            out[i] = out[i - 1]
+            out[i, positions] = states
+        else:
+            raise ValueError(f"corrupt chunk: record kind {kind} for row {i}")
+    return out
+
+
+class DeltaWriter:
+    # Stream consumer: update(block) appends block[key]. Same arguments as ca_history.HistoryWriter
+    # plus keyframe_every; cells are always 2 bits.
+    def __init__(self, path, width, bits=2, rules=None, key='rows', keyframe_every=DEFAULT_KEYFRAME_EVERY,
+                 **metadata):
+        if bits != 2:
+            raise ValueError(f"{EXTENSION} histories store 2 bits per cell, got bits={bits}")
+        self.path = path
+        self.key = key
+        self.header = ca_history.make_header(width, bits, rules, content=key, encoding='delta',
+                                             keyframe_every=keyframe_every, **metadata)
+        self.width = self.header['width']
+        self.keyframe_every = keyframe_every
+        self.dtype = index_dtype(self.width)
+        self.file = self.open()
+        self.file.write(ca_history.encode_header(self.header, MAGIC))
+        self.generations = 0
+        self.pending = []  # records of the chunk being filled
+        self.prev = None
+
+    def open(self):
+        return open(self.path, 'wb')
+
+    def append(self, rows):
+        rows = np.asarray(rows, dtype=np.uint8)
+        if rows.ndim == 1:
+            rows = rows[None, :]
+        if rows.shape[-1] != self.width:
+            raise ValueError(f"rows have {rows.shape[-1]} cells, history width is {self.width}")
+        for row in rows:
+            self.pending.append(encode_row(row, self.prev if self.pending else None, self.dtype))
+            self.prev = row.copy()  # blocks may reuse their buffers
+            self.generations += 1
+            if len(self.pending) == self.keyframe_every:
+                self.write_chunk()
+
+    def update(self, block):
+        rows = block.get(self.key)
+        if rows is not None and len(rows):
+            self.append(rows)
+
+    def write_chunk(self):
+        if self.pending:
+            payload = b''.join(self.pending)
+            self.file.write(CHUNK_HEADER.pack(len(payload), len(self.pending)) + payload)
+            self.pending = []
+
+    def flush(self, sync=False):
+        # Also ends the current chunk, so the next row starts a new keyframe
+        self.write_chunk()
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if not self.file.closed:
+            self.flush(sync=True)
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CompressedHistory(DeltaWriter):
+    # The same records in memory: a stream consumer for keeping every row of a long run
+    def __init__(self, width, keyframe_every=DEFAULT_KEYFRAME_EVERY, key='rows', **metadata):
+        super().__init__(None, width, key=key, keyframe_every=keyframe_every, **metadata)
+
+    def open(self):
+        return io.BytesIO()
+
+    def close(self):
+        self.write_chunk()
+
+    @property
+    def nbytes(self):
+        return self.file.tell() + sum(map(len, self.pending))
+
+    def reader(self):
+        self.write_chunk()
+        return DeltaReader(self.file.getvalue())
+
+
+class DeltaReader:
+    # Same reading interface as ca_history.HistoryReader; path may also be the bytes of a history
+    def __init__(self, path):
+        self.path = path
+        with self.open() as file:
+            self.header, self.offset = ca_history.parse_header(file, MAGIC, path if isinstance(path, str) else 'data')
+        self.width = self.header['width']
+        self.bits = self.header['bits']
+        self.dtype = index_dtype(self.width)
+        self.chunks = []  # (file offset of the payload, first generation, rows)
+        self.end = self.offset  # where the next unindexed chunk starts
+        self.total = 0
+
+    def open(self):
+        return open(self.path, 'rb') if isinstance(self.path, str) else io.BytesIO(self.path)
+
+    def scan(self):
+        # Index chunk headers written since the last scan, stopping at a chunk not complete yet
+        with self.open() as file:
+            size = file.seek(0, os.SEEK_END)
+            while self.end + CHUNK_HEADER.size <= size:
+                file.seek(self.end)
+                length, rows = CHUNK_HEADER.unpack(file.read(CHUNK_HEADER.size))
+                if self.end + CHUNK_HEADER.size + length > size:
+                    break
+                self.chunks.append((self.end + CHUNK_HEADER.size, self.total, rows))
+                self.end += CHUNK_HEADER.size + length
+                self.total += rows
+
+    @property
+    def generations(self):
+        self.scan()
+        return self.total
+
+    def rules(self):
+        return self.header.get('rules')
+
+    def rows(self, start=0, stop=None):
+        # uint8 cells for a generation range; only the chunks overlapping it are decoded
+        start, stop, _ = slice(start, stop).indices(self.generations)
+        out = np.zeros((max(stop - start, 0), self.width), dtype=np.uint8)
+        if stop <= start:
+            return out
+        first = np.searchsorted([chunk[1] for chunk in self.chunks], start, side='right') - 1
+        with self.open() as file:
+            for offset, begin, rows in self.chunks[first:]:
+                if begin >= stop:
+                    break
+                end = begin + rows
+                file.seek(offset - CHUNK_HEADER.size)
+                length = CHUNK_HEADER.unpack(file.read(CHUNK_HEADER.size))[0]
+                decoded = decode_chunk(file.read(length), min(rows, stop - begin), self.width, self.dtype,
+                                       np.empty((rows, self.width), dtype=np.uint8))
+                lo, hi = max(start, begin), min(stop, end)
+                out[lo - start:hi - start] = decoded[lo - begin:hi - begin]
+        return out
+
+    def iter_blocks(self, block_size=4096):
+        # Same {'start', 'rows'} blocks as ca_sim.iter_blocks, read back from disk
+        total = self.generations
+        for start in range(0, total, block_size):
+            yield {'start': start, 'rows': self.rows(start, min(start + block_size, total)), 'transitions': []}
+
+
+def compress(history_path, delta_path, keyframe_every=DEFAULT_KEYFRAME_EVERY, block_size=4096):
+    # Streaming .cahist -> .cadelta conversion, header metadata carried over
+    reader = ca_history.HistoryReader(history_path)
+    metadata = {k: v for k, v in reader.header.items() if k not in ('width', 'bits', 'content', 'rules')}
+    with DeltaWriter(delta_path, reader.width, rules=reader.rules(), key=reader.header.get('content', 'rows'),
+                     keyframe_every=keyframe_every, **metadata) as writer:
+        for block in reader.iter_blocks(block_size):
+            writer.append(block['rows'])
+    return delta_path
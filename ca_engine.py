@@ -0,0 +1,307 @@
+import copy
+import functools
+import hashlib
+import numpy as np
+
+"""
+Vectorized engine for the 3-state neighborhood rules used in Phases II-VI.
+
+A rules dict such as DEFAULT_RULES, BASIC_RULES or the output of generate_weighted_rule_set
+is compiled into a 27-entry lookup table. Every neighborhood is encoded as 9*left + 3*center + right,
+so advancing a whole row is a single gather into that table instead of a next_state call per cell.
+Cells past either edge read as 0 (struggling), exactly like the loops in CAApp.evolve.
+"""
+ENGINE_VERSION = 2  # bump whenever the same inputs would produce different rows (invalidates ca_cache)
+STATES = [0, 1, 2]
+NUM_STATES = 3
+NUM_NEIGHBORHOODS = NUM_STATES ** 3
+REASONS = ['rule', 'inheritance', 'intervention', 'random']  # why a cell got its new state (Phase V)
+REASON_RULE, REASON_INHERITANCE, REASON_INTERVENTION, REASON_RANDOM = range(len(REASONS))  # reason plane codes
+
+
+def decode_neighborhood(code):
+    return code // 9, (code // 3) % 3, code % 3
+
+
+def compile_rules(rules):
+    # Combos missing from the dict default to the center value, same as rules.get((l, c, r), c)
+    return _compile_items(tuple(sorted(rules.items()))).copy()
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_items(items):
+    # Compiled tables by rule content, so the same rule set is only compiled once
+    rules = dict(items)
+    table = np.empty(NUM_NEIGHBORHOODS, dtype=np.uint8)
+    for code in range(NUM_NEIGHBORHOODS):
+        l, c, r = decode_neighborhood(code)
+        table[code] = rules.get((l, c, r), c)
+    return table
+
+
+def table_digest(table):
+    # Canonical content hash of a rule table, equal for a rules dict and its compiled table
+    return hashlib.sha256(as_rules(table).tobytes()).hexdigest()
+
+
+def as_table(rules):
+    # Accept either a rules dict or an already compiled table
+    if isinstance(rules, dict):
+        return compile_rules(rules)
+    table = np.asarray(rules, dtype=np.uint8)
+    if table.shape != (NUM_NEIGHBORHOODS,):
+        raise ValueError(f"rule table must have {NUM_NEIGHBORHOODS} entries, got shape {table.shape}")
+    return table
+
+
+def rule_probabilities(weights):
+    # Stochastic rules: a (27, 3) matrix, row 9l+3c+r holding the next-state probabilities of that
+    # neighborhood. weights is one worldview's 3 weights (the same for every neighborhood), a
+    # {(l, c, r): weights} dict (missing neighborhoods keep their center), or the matrix itself.
+    if isinstance(weights, dict):
+        probabilities = np.zeros((NUM_NEIGHBORHOODS, NUM_STATES))
+        for code in range(NUM_NEIGHBORHOODS):
+            l, c, r = decode_neighborhood(code)
+            if (l, c, r) in weights:
+                probabilities[code] = weights[(l, c, r)]
+            else:
+                probabilities[code, c] = 1.0
+    else:
+        probabilities = np.broadcast_to(np.asarray(weights, dtype=np.float64), (NUM_NEIGHBORHOODS, NUM_STATES))
+    return as_rules(probabilities.copy())
+
+
+def is_stochastic(rules):
+    # A rule table maps each neighborhood to one next state, stochastic rules to 3 probabilities
+    return not isinstance(rules, dict) and np.ndim(rules) == 2
+
+
+def as_rules(rules):
+    # as_table, or the float64 probability matrix of stochastic rules
+    if not is_stochastic(rules):
+        return as_table(rules)
+    probabilities = np.asarray(rules, dtype=np.float64)
+    if probabilities.shape != (NUM_NEIGHBORHOODS, NUM_STATES):
+        raise ValueError(f"stochastic rules must be a ({NUM_NEIGHBORHOODS}, {NUM_STATES}) matrix, "
+                         f"got shape {probabilities.shape}")
+    if (probabilities < 0).any() or not (probabilities.sum(axis=1) > 0).all():
+        raise ValueError("rule probabilities must be non-negative with a positive sum per neighborhood")
+    return probabilities
+
+
+def as_row(row):
+    arr = np.asarray(row)
+    if arr.size and (arr.min() < 0 or arr.max() >= NUM_STATES):
+        raise ValueError("cells must be 0 (struggling), 1 (stable) or 2 (thriving)")
+    return arr.astype(np.uint8)
+
+
+def neighborhood_codes(row, out=None):
+    # Works on any leading axes, the last axis is the row of cells. Zero padding at both edges.
+    row = np.asarray(row, dtype=np.uint8)
+    codes = np.multiply(row, 3, out=out, dtype=np.uint8)
+    codes[..., 1:] += 9 * row[..., :-1]
+    codes[..., :-1] += row[..., 1:]
+    return codes
+
+
+def step(row, table, out=None):
+    codes = neighborhood_codes(row)
+    return np.take(table, codes, out=out)
+
+
+def sample_step(row, probabilities, uniforms):
+    # Stochastic rules: every cell draws its next state from its neighborhood's probabilities, using
+    # one uniform in [0, 1) per cell and the cumulative-weight lookup of rng.choice(STATES, p=...)
+    cdf = np.cumsum(probabilities, axis=1)
+    cdf /= cdf[:, -1:]
+    codes = neighborhood_codes(row)
+    nxt = (uniforms >= np.take(cdf[:, 0], codes)).astype(np.uint8)
+    nxt += uniforms >= np.take(cdf[:, 1], codes)
+    return nxt
+
+
+def is_quiescent(table):
+    # An all-struggling neighborhood stays struggling, so a zero background never changes on its own
+    return table[0] == 0
+
+
+def active_window(row, offset=0):
+    # [lo, hi) around the non-zero cells of a row (or of a slice starting at offset), (0, 0) if none
+    nonzero = np.flatnonzero(row)
+    if not nonzero.size:
+        return 0, 0
+    return offset + int(nonzero[0]), offset + int(nonzero[-1]) + 1
+
+
+def light_cone(window, width):
+    # Cells that can be non-zero one generation after a row that is zero outside window
+    lo, hi = window
+    return max(lo - 1, 0), min(hi + 1, width)
+
+
+def evolve(initial_row, rules, generations):
+    # Returns a (generations, width) uint8 array whose first row is the initial row.
+    # With quiescent rules only the light cone of the non-zero cells is stepped, so a single seed
+    # costs O(generations^2) instead of O(generations x width); the result is the same.
+    table = as_table(rules)
+    row = as_row(initial_row)
+    if row.ndim != 1 or not is_quiescent(table):
+        history = np.empty((generations,) + row.shape, dtype=np.uint8)
+        if generations == 0:
+            return history
+        history[0] = row
+        for t in range(1, generations):
+            step(history[t - 1], table, out=history[t])
+        return history
+
+    history = np.zeros((generations,) + row.shape, dtype=np.uint8)
+    if generations == 0:
+        return history
+    history[0] = row
+    window = active_window(row)
+    for t in range(1, generations):
+        a, b = light_cone(window, row.shape[-1])
+        step(history[t - 1, a:b], table, out=history[t, a:b])
+        window = active_window(history[t, a:b], a)
+    return history
+
+
+
+class CycleDetector:
+    # Hash table of every row seen so far, keyed by a 128-bit digest so it costs 16 bytes per
+    # generation whatever the width. see(row, generation) returns the earlier generation holding the
+    # same row, or None. For a deterministic step that earlier generation is the transient length
+    # and the difference is the period (1 for a fixed point).
+    def __init__(self):
+        self.first_seen = {}
+
+    def see(self, row, generation):
+        key = hashlib.blake2b(np.ascontiguousarray(row, dtype=np.uint8).tobytes(), digest_size=16).digest()
+        first = self.first_seen.setdefault(key, generation)
+        return None if first == generation else first
+
+
+def neighbors(row):
+    # Zero-padded left and right neighbor arrays along the last axis
+    row = np.asarray(row, dtype=np.uint8)
+    left = np.zeros_like(row)
+    right = np.zeros_like(row)
+    left[..., 1:] = row[..., :-1]
+    right[..., :-1] = row[..., 1:]
+    return left, right
+
+
+def inheritance_intervention(row, base):
+    # Phase V: two thriving neighbors lift the center a level (inheritance), two struggling
+    # neighbors pull it down a level (intervention). Both look at the center, not the rule result.
+    left, right = neighbors(row)
+    inherit = (row < 2) & (left == 2) & (right == 2)
+    intervene = ~inherit & (row > 0) & (left == 0) & (right == 0)
+    out = np.where(inherit, row + 1, base)
+    out = np.where(intervene, row - 1, out)
+    return out.astype(np.uint8), inherit, intervene
+
+
+def adjust_rule_result(row, base):
+    # Phase VI: the same neighbor tests, applied to the rule result instead of the center
+    left, right = neighbors(row)
+    rise = (base < 2) & (left == 2) & (right == 2)
+    fall = ~rise & (base > 0) & (left == 0) & (right == 0)
+    out = base + rise.astype(np.uint8)
+    out -= fall.astype(np.uint8)
+    return out
+
+
+def phase_v_step(row, table, rng=None, randomness_level=0.0, generation=0, offset=0):
+    # Phase V for the whole row as boolean masks, plus a uint8 reason plane saying
+    # why each cell got its state. Priority: random, then inheritance, then intervention, then rule.
+    row = np.asarray(row, dtype=np.uint8)
+    nxt, inherit, intervene = inheritance_intervention(row, step(row, table))
+    reasons = inherit.astype(np.uint8)  # REASON_INHERITANCE == 1, the masks never overlap
+    reasons[intervene] = REASON_INTERVENTION
+    if rng is not None and randomness_level > 0:
+        hit = random_events(nxt, rng, randomness_level, generation, offset)
+        reasons[hit] = REASON_RANDOM
+    return nxt, reasons
+
+
+def random_events(row, rng, level, generation=0, offset=0):
+    # Each cell is hit with probability level and then takes one of STATES uniformly at random.
+    # rng is a numpy Generator or a CellStreams, whose draws of that generation are for the cells
+    # offset, offset + 1, ... of the run; a (replicates, width) stack reads as one row of
+    # replicates * width cells, so it is drawn in one call and row k sits at offset + k * width.
+    if isinstance(rng, CellStreams):
+        hit, values = rng.events(generation, offset, offset + row.size, level)
+        hit = hit.reshape(row.shape)
+    else:
+        hit, values = draw_events(rng, row.shape, level)
+    row[hit] = values
+    return hit
+
+
+def draw_events(rng, shape, level):
+    # The draws of random_events from a Generator: which cells are hit, then the new states of the hit cells in order
+    hit = rng.random(shape) < level
+    return hit, rng.integers(0, NUM_STATES, size=int(hit.sum()), dtype=np.uint8)
+
+
+CELL_BLOCK = 1 << 14  # cells per counter-based stream
+RULE_STREAM, EVENT_STREAM = range(2)  # stochastic rule samples, random events
+
+
+class CellStreams:
+    # Counter-based random numbers of one run. The float32 uniforms of generation t for the cells
+    # [j * CELL_BLOCK, (j + 1) * CELL_BLOCK) come from Philox under the run's key, starting at the
+    # counter (0, stream, j, t). So any cells of any generation are drawn without drawing the rest of
+    # the row: a shard draws only its own cells, and the draws do not depend on how the row is split.
+    def __init__(self, key):
+        self.key = np.asarray(key, dtype=np.uint64)
+        self.bit_generator = np.random.Philox(key=self.key)
+        self.generator = np.random.Generator(self.bit_generator)
+
+    @classmethod
+    def from_rng(cls, rng):
+        # Keyed by rng's current state, which is left as it is: the same rng state gives the same run
+        return cls(copy.deepcopy(rng).integers(2 ** 64, size=2, dtype=np.uint64))
+
+    def uniforms(self, generation, lo, hi, stream=RULE_STREAM):
+        # One uniform in [0, 1) for each cell in [lo, hi). Each block is drawn from its start, so the
+        # first block costs up to CELL_BLOCK extra draws.
+        first = lo // CELL_BLOCK
+        out = np.empty(hi - first * CELL_BLOCK, dtype=np.float32)
+        for begin in range(0, len(out), CELL_BLOCK):
+            self.bit_generator.state = {
+                'bit_generator': 'Philox', 'buffer': np.zeros(4, dtype=np.uint64), 'buffer_pos': 4,
+                'has_uint32': 0, 'uinteger': 0,
+                'state': {'counter': np.array([0, stream, first + begin // CELL_BLOCK, generation], dtype=np.uint64),
+                          'key': self.key}}
+            self.generator.random(dtype=np.float32, out=out[begin:begin + CELL_BLOCK])
+        return out[lo - first * CELL_BLOCK:]
+
+    def events(self, generation, lo, hi, level):
+        # random_events for cells [lo, hi) from one uniform u per cell: hit when u < level, and as
+        # u / level is then uniform in [0, 1), the new state is int(3 * u / level)
+        u = self.uniforms(generation, lo, hi, EVENT_STREAM)
+        hit = u < np.float32(level)
+        values = np.minimum(u[hit] * np.float32(NUM_STATES / level), NUM_STATES - 1).astype(np.uint8)
+        return hit, values
+
+
+OVERLAYS = (None, 'phase_v', 'phase_vi')
+
+
+def stochastic_step(row, table, rng=None, randomness_level=0.0, overlay=None, generation=0):
+    # One generation of the Phase III-VI update for a whole row (or a stack of rows), generation
+    # being the one computed. Priority: random event, then the overlay, then the rule.
+    if overlay not in OVERLAYS:
+        raise ValueError(f"unknown overlay {overlay!r}, expected one of {OVERLAYS}")
+    row = np.asarray(row, dtype=np.uint8)
+    if overlay == 'phase_v':
+        return phase_v_step(row, table, rng, randomness_level, generation)[0]
+    nxt = step(row, table)
+    if overlay == 'phase_vi':
+        nxt = adjust_rule_result(row, nxt)
+    if rng is not None and randomness_level > 0:
+        random_events(nxt, rng, randomness_level, generation)
+    return nxt
@@ -0,0 +1,53 @@
+import numpy as np
+import ca_engine
+import ca_sim
+import ca_stats
+
+"""
+Batched ensemble runs for the stochastic phases (III-VI).
+
+Instead of one Tk run at a time, a (replicates, width) array is evolved in a single vectorized
+step per generation. No Tk app is needed. The random events of a generation are drawn for the whole
+stack in one call from the counter-based streams of the seed's 'events' child (ca_engine.CellStreams),
+replicate k being the cells [k * width, (k + 1) * width) of one long row. So the ensemble is
+reproducible from its seed and any single replicate can be replayed bit for bit with
+replay_replicate, drawing only its own cells, without its siblings.
+
+    result = run_ensemble(init, DEFAULT_RULES, generations=50, replicates=500,
+                          randomness_level=0.01, seed=7)
+    result['mean']       # (generations, 3) mean count of each state
+    result['quantiles']  # (len(quantiles), generations, 3) bands for the distribution plot
+"""
+DEFAULT_QUANTILES = (0.05, 0.5, 0.95)
+
+
+def run_ensemble(initial_row, rules, generations, replicates=100, randomness_level=0.1,
+                 seed=None, overlay=None, quantiles=DEFAULT_QUANTILES):
+    table = ca_engine.as_table(rules)
+    row = ca_engine.as_row(initial_row)
+    root = ca_sim.seed_sequence(seed)
+    streams = ca_engine.CellStreams.from_rng(ca_sim.spawn_streams(root)['events'])
+
+    rows = np.repeat(row[None, :], replicates, axis=0)
+    counts = np.empty((replicates, generations, ca_engine.NUM_STATES), dtype=np.int64)
+    if generations:
+        counts[:, 0] = ca_stats.row_counts(rows)
+    for t in range(1, generations):
+        rows = ca_engine.stochastic_step(rows, table, streams, randomness_level, overlay, t)
+        counts[:, t] = ca_stats.row_counts(rows)
+
+    return {
+        'counts': counts,
+        'mean': counts.mean(axis=0),
+        'quantile_levels': tuple(quantiles),
+        'quantiles': np.quantile(counts, quantiles, axis=0),
+        'final_rows': rows,
+        'seed_entropy': root.entropy,
+    }
+
+
+def replay_replicate(initial_row, rules, generations, replicate, randomness_level=0.1, seed=None, overlay=None):
+    # One replicate of run_ensemble as a full ca_sim.run result (history, stats, ...)
+    rng = ca_sim.spawn_streams(seed)['events']
+    width = np.shape(initial_row)[-1]
+    return ca_sim.run(initial_row, rules, generations, randomness_level, overlay, rng, offset=replicate * width)
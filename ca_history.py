@@ -0,0 +1,252 @@
+import argparse
+import json
+import os
+import struct
+import numpy as np
+import ca_engine
+
+"""
+Binary on-disk history format for simulation runs (.cahist).
+
+Layout:
+    8 bytes    magic b'CAHIST1\\n'
+    4 bytes    little-endian uint32 length of the JSON header
+    JSON       header: width, bits per cell, phase, rules (27-entry table), seed, ... padded with
+               spaces so the rows start on a 64-byte boundary
+    rows       one fixed-size record per generation, appended as the simulation runs
+
+Rows are stored either one uint8 per cell (bits=8) or packed four cells per byte (bits=2, enough
+for the three states). The generation count is never written: it is the data size divided by the
+row size, so a run can keep appending and a reader always sees every complete row. Reading goes
+through numpy.memmap, so any generation range of the raw records is a zero-copy view.
+"""
+MAGIC = b'CAHIST1\n'
+ALIGN = 64
+EXTENSION = '.cahist'
+
+# 2-bit unpacking table: byte value -> the four cells it holds, lowest bits first
+_UNPACK_2BIT = np.array([[(b >> shift) & 3 for shift in (0, 2, 4, 6)] for b in range(256)], dtype=np.uint8)
+
+
+def row_bytes(width, bits):
+    if bits == 8:
+        return width
+    if bits == 2:
+        return (width + 3) // 4
+    raise ValueError(f"bits per cell must be 8 or 2, got {bits}")
+
+
+def pack_2bit(rows):
+    rows = np.asarray(rows, dtype=np.uint8)
+    width = rows.shape[-1]
+    padded = np.zeros(rows.shape[:-1] + (row_bytes(width, 2) * 4,), dtype=np.uint8)
+    padded[..., :width] = rows
+    quads = padded.reshape(rows.shape[:-1] + (row_bytes(width, 2), 4))  # explicit, -1 fails for zero rows
+    return quads[..., 0] | (quads[..., 1] << 2) | (quads[..., 2] << 4) | (quads[..., 3] << 6)
+
+
+def unpack_2bit(packed, width):
+    packed = np.asarray(packed, dtype=np.uint8)
+    cells = _UNPACK_2BIT[packed]
+    return cells.reshape(packed.shape[:-1] + (packed.shape[-1] * 4,))[..., :width]
+
+
+def _json_safe(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_json_safe(v) for v in value]
+    return repr(value)
+
+
+def make_header(width, bits=2, rules=None, **metadata):
+    header = {'width': int(width), 'bits': int(bits)}
+    if rules is not None:
+        header['rules'] = ca_engine.as_rules(rules).tolist()
+    header.update({key: _json_safe(value) for key, value in metadata.items()})
+    return header
+
+
+def encode_header(header, magic=MAGIC):
+    body = json.dumps(header, sort_keys=True).encode('utf-8')
+    used = len(magic) + 4 + len(body)
+    body += b' ' * (-used % ALIGN)
+    return magic + struct.pack('<I', len(body)) + body
+
+
+def parse_header(file, magic=MAGIC, name='history'):
+    # (header, offset of the first record) from an open binary file positioned at its start
+    if file.read(len(magic)) != magic:
+        raise ValueError(f"{name} is not a {magic.strip().decode('ascii')} history file")
+    (length,) = struct.unpack('<I', file.read(4))
+    header = json.loads(file.read(length).decode('utf-8'))
+    return header, len(magic) + 4 + length
+
+
+def read_header(path, magic=MAGIC):
+    with open(path, 'rb') as file:
+        return parse_header(file, magic, path)
+
+
+def open_history(path):
+    # HistoryReader for .cahist files, ca_delta.DeltaReader for compressed ones (told apart by magic)
+    import ca_delta
+    with open(path, 'rb') as file:
+        magic = file.read(len(MAGIC))
+    return ca_delta.DeltaReader(path) if magic == ca_delta.MAGIC else HistoryReader(path)
+
+
+class HistoryWriter:
+    # Appends rows to a new history file. Also a stream consumer: update(block) appends block[key],
+    # 'rows' for the states or 'reasons' for Phase V's reason plane (codes 0-3 fit in 2 bits too).
+    def __init__(self, path, width, bits=2, rules=None, key='rows', **metadata):
+        self.path = path
+        self.key = key
+        self.header = make_header(width, bits, rules, content=key, **metadata)
+        self.width = self.header['width']
+        self.bits = self.header['bits']
+        self.row_bytes = row_bytes(self.width, self.bits)
+        self.file = open(path, 'wb')
+        self.file.write(encode_header(self.header))
+        self.generations = 0
+
+    @classmethod
+    def reopen(cls, path, generations):
+        # Continue an existing history after its first `generations` rows, dropping any rows (or
+        # partial row) written after them, e.g. when resuming from a checkpoint
+        header, offset = read_header(path)
+        writer = cls.__new__(cls)
+        writer.path, writer.header = path, header
+        writer.key = header.get('content', 'rows')
+        writer.width, writer.bits = header['width'], header['bits']
+        writer.row_bytes = row_bytes(writer.width, writer.bits)
+        have = (os.path.getsize(path) - offset) // writer.row_bytes
+        if have < generations:
+            raise ValueError(f"{path} holds {have} generations, cannot continue after {generations}")
+        writer.file = open(path, 'r+b')
+        writer.file.truncate(offset + generations * writer.row_bytes)
+        writer.file.seek(0, os.SEEK_END)
+        writer.generations = generations
+        return writer
+
+    def append(self, rows):
+        rows = np.asarray(rows, dtype=np.uint8)
+        if rows.ndim == 1:
+            rows = rows[None, :]
+        if rows.shape[-1] != self.width:
+            raise ValueError(f"rows have {rows.shape[-1]} cells, history width is {self.width}")
+        records = pack_2bit(rows) if self.bits == 2 else rows
+        self.file.write(np.ascontiguousarray(records).tobytes())
+        self.generations += rows.shape[0]
+
+    def update(self, block):
+        rows = block.get(self.key)
+        if rows is not None and len(rows):
+            self.append(rows)
+
+    def flush(self, sync=False):
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if not self.file.closed:
+            self.flush(sync=True)
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class HistoryReader:
+    def __init__(self, path):
+        self.path = path
+        self.header, self.offset = read_header(path)
+        self.width = self.header['width']
+        self.bits = self.header['bits']
+        self.row_bytes = row_bytes(self.width, self.bits)
+
+    @property
+    def generations(self):
+        # Only complete rows count, so a file still being written reads cleanly
+        return (os.path.getsize(self.path) - self.offset) // self.row_bytes
+
+    def rules(self):
+        return self.header.get('rules')
+
+    def records(self, start=0, stop=None):
+        # Zero-copy memmap view of the raw (possibly 2-bit packed) records
+        total = self.generations
+        start, stop, _ = slice(start, stop).indices(total)
+        if stop <= start:
+            return np.zeros((0, self.row_bytes), dtype=np.uint8)
+        return np.memmap(self.path, dtype=np.uint8, mode='r', offset=self.offset + start * self.row_bytes,
+                         shape=(stop - start, self.row_bytes))
+
+    def rows(self, start=0, stop=None):
+        # uint8 cells for a generation range, a view for bits=8 and an unpacked copy for bits=2
+        records = self.records(start, stop)
+        return unpack_2bit(records, self.width) if self.bits == 2 else records
+
+    def iter_blocks(self, block_size=4096):
+        # Same {'start', 'rows'} blocks as ca_sim.iter_blocks, read back from disk
+        total = self.generations
+        for start in range(0, total, block_size):
+            yield {'start': start, 'rows': self.rows(start, min(start + block_size, total)), 'transitions': []}
+
+
+def export_csv(history_path, csv_path, start=0, stop=None, block_size=4096):
+    # Streaming converter: one block of rows in memory at a time, same layout as Phase V's CSV
+    reader = open_history(history_path)
+    start, stop, _ = slice(start, stop).indices(reader.generations)
+    with open(csv_path, 'w', newline='') as file:
+        file.write(','.join(f"Cell {i}" for i in range(reader.width)) + '\r\n')
+        for first in range(start, stop, block_size):
+            rows = reader.rows(first, min(first + block_size, stop))
+            np.savetxt(file, rows, fmt='%d', delimiter=',', newline='\r\n')
+    return csv_path
+
+
+def save_history(path, history, **header):
+    # Write a whole in-memory history in one go
+    history = np.asarray(history, dtype=np.uint8)
+    with HistoryWriter(path, history.shape[-1], **header) as writer:
+        writer.append(history)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or convert .cahist and .cadelta history files.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    info = sub.add_parser('info', help="print the header and generation count")
+    info.add_argument('path')
+    to_csv = sub.add_parser('to-csv', help="stream a generation range out as CSV")
+    to_csv.add_argument('path')
+    to_csv.add_argument('csv_path')
+    to_csv.add_argument('--start', type=int, default=0)
+    to_csv.add_argument('--stop', type=int)
+    compress = sub.add_parser('compress', help="convert a .cahist file to a delta/run-length .cadelta file")
+    compress.add_argument('path')
+    compress.add_argument('delta_path')
+    compress.add_argument('--keyframe-every', type=int, default=256)
+    args = parser.parse_args(argv)
+
+    if args.command == 'info':
+        reader = open_history(args.path)
+        print(json.dumps(dict(reader.header, generations=reader.generations), indent=2))
+    elif args.command == 'compress':
+        import ca_delta
+        ca_delta.compress(args.path, args.delta_path, args.keyframe_every)
+        print(f"{args.path}: {os.path.getsize(args.path)} bytes -> {args.delta_path}: "
+              f"{os.path.getsize(args.delta_path)} bytes")
+    else:
+        export_csv(args.path, args.csv_path, args.start, args.stop)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import argparse
+import os
+import numpy as np
+import ca_engine
+import ca_history
+import ca_render
+import ca_sim
+import ca_stats
+
+"""
+2D lattice mode: the 3 states on a grid of households instead of a single row.
+
+Every cell sees its von Neumann (4 orthogonal) or Moore (8 surrounding) neighbors. The frame is
+copied into a buffer one cell larger on each side (zeros, or the opposite edge for periodic
+boundaries), and every neighbor is a shifted view of that buffer, so a generation is a handful of
+whole-array additions and one gather into a lookup table. Three kinds of rule tables:
+
+    totalistic  sum of the center and its neighbors (0 .. 2(n+1)), like example3state.py
+    outer       center and the sum of its neighbors apart: 3 x (2n+1) entries
+    full        every cell of the neighborhood, base 3 with the center as the top digit
+                (243 entries for von Neumann, 19683 for Moore)
+
+A rule number is the table in base 3, digit i (most significant first) being the new state for
+code i, the same convention as ca_totalistic. Without a number the table is drawn from a Phase VI
+worldview, one weighted draw per code.
+
+Only the current and the next frame are held in memory. iter_blocks yields one block per
+generation, shaped like ca_sim.iter_blocks' ({'start', 'rows'} with the frame flattened to one
+row, plus 'frame'), so ca_sim.stream and ca_stats.RunStatistics work unchanged, and a
+SnapshotWriter streams every k-th frame to a .cahist file:
+
+    python ca_lattice.py --shape 2000 2000 --generations 1000 --neighborhood moore --boundary periodic \\
+        --kind outer --model optimistic --init random --seed 7 --every 10 --out runs/city
+"""
+NEIGHBORHOODS = {
+    'von_neumann': ((-1, 0), (0, -1), (0, 1), (1, 0)),
+    'moore': ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)),
+}
+BOUNDARIES = ('zero', 'periodic')
+KINDS = ('totalistic', 'outer', 'full')
+NUM_STATES = ca_engine.NUM_STATES
+
+
+def table_size(kind, neighborhood):
+    n = len(NEIGHBORHOODS[neighborhood])
+    if kind == 'totalistic':
+        return (NUM_STATES - 1) * (n + 1) + 1
+    if kind == 'outer':
+        return NUM_STATES * ((NUM_STATES - 1) * n + 1)
+    if kind == 'full':
+        return NUM_STATES ** (n + 1)
+    raise ValueError(f"unknown rule kind {kind!r}, expected one of {KINDS}")
+
+
+def rule_table(number, kind='totalistic', neighborhood='moore'):
+    size = table_size(kind, neighborhood)
+    number = int(number)
+    if not 0 <= number < NUM_STATES ** size:
+        raise ValueError(f"{kind} {neighborhood} rule numbers go from 0 to 3^{size} - 1")
+    digits = []
+    for _ in range(size):
+        number, digit = divmod(number, NUM_STATES)
+        digits.append(digit)
+    return np.array(digits[::-1], dtype=np.uint8)
+
+
+def weighted_table(kind='totalistic', neighborhood='moore', model='balanced', rng=None):
+    # One draw per code with a worldview's weights, like ca_sim.generate_weighted_rule_set
+    rng = np.random.default_rng() if rng is None else rng
+    weights = ca_sim.WORLDVIEW_WEIGHTS.get(model, [1 / 3, 1 / 3, 1 / 3])
+    return rng.choice(NUM_STATES, size=table_size(kind, neighborhood), p=weights).astype(np.uint8)
+
+
+def as_table(table, kind, neighborhood):
+    table = np.asarray(table, dtype=np.uint8)
+    size = table_size(kind, neighborhood)
+    if table.shape != (size,):
+        raise ValueError(f"{kind} {neighborhood} rule table must have {size} entries, got shape {table.shape}")
+    if table.max(initial=0) >= NUM_STATES:
+        raise ValueError("rule table entries must be 0, 1 or 2")
+    return table
+
+
+def center_frame(shape, state=2):
+    frame = np.zeros(shape, dtype=np.uint8)
+    frame[shape[0] // 2, shape[1] // 2] = state
+    return frame
+
+
+def random_frame(shape, rng=None):
+    rng = np.random.default_rng() if rng is None else rng
+    return rng.integers(0, NUM_STATES, size=shape, dtype=np.uint8)
+
+
+def pad_into(frame, padded, boundary='zero'):
+    # Frame into the interior of padded (one cell larger on each side). With zero boundaries the
+    # border is never written, so it stays as allocated: zeros.
+    padded[1:-1, 1:-1] = frame
+    if boundary == 'periodic':
+        padded[0, 1:-1] = frame[-1]
+        padded[-1, 1:-1] = frame[0]
+        padded[:, 0] = padded[:, -2]
+        padded[:, -1] = padded[:, 1]
+    return padded
+
+
+def neighborhood_codes(padded, kind='totalistic', neighborhood='moore'):
+    # Table index of every interior cell of padded, from shifted views only
+    height, width = padded.shape[0] - 2, padded.shape[1] - 2
+
+    def view(dy, dx):
+        return padded[1 + dy:1 + dy + height, 1 + dx:1 + dx + width]
+
+    center = view(0, 0)
+    if kind == 'full':
+        codes = center.astype(np.uint16)
+        for dy, dx in NEIGHBORHOODS[neighborhood]:
+            codes *= NUM_STATES
+            codes += view(dy, dx)
+        return codes
+    if neighborhood == 'moore':
+        # 3x3 box sum, done separably: 4 additions instead of 8
+        across = padded[:, :-2] + padded[:, 1:-1]
+        across += padded[:, 2:]
+        total = across[:-2] + across[1:-1]
+        total += across[2:]
+    else:
+        total = center + view(-1, 0)
+        for dy, dx in NEIGHBORHOODS[neighborhood][1:]:
+            total += view(dy, dx)
+    if kind == 'outer':
+        total -= center  # neighbors only
+        total += center * np.uint8((NUM_STATES - 1) * len(NEIGHBORHOODS[neighborhood]) + 1)
+    return total
+
+
+def iter_blocks(initial_frame, table, generations, kind='totalistic', neighborhood='moore', boundary='zero',
+                randomness_level=0.0, rng=None):
+    # One {'start', 'rows', 'frame', 'transitions'} block per generation, 'rows' being the frame as
+    # a single (1, height x width) row. Both are views of one of the two rolling frames: valid
+    # until the next block, consumers that keep them must copy.
+    if kind not in KINDS:
+        raise ValueError(f"unknown rule kind {kind!r}, expected one of {KINDS}")
+    if neighborhood not in NEIGHBORHOODS:
+        raise ValueError(f"unknown neighborhood {neighborhood!r}, expected one of {list(NEIGHBORHOODS)}")
+    if boundary not in BOUNDARIES:
+        raise ValueError(f"unknown boundary {boundary!r}, expected one of {BOUNDARIES}")
+    table = as_table(table, kind, neighborhood)
+    frame = ca_engine.as_row(initial_frame)
+    if frame.ndim != 2:
+        raise ValueError(f"a lattice frame is 2D, got shape {frame.shape}")
+    if randomness_level > 0 and rng is None:
+        rng = np.random.default_rng()
+    height, width = frame.shape
+    frames = np.empty((2, height, width), dtype=np.uint8)
+    padded = np.zeros((height + 2, width + 2), dtype=np.uint8)
+    frames[0] = frame
+    for t in range(generations):
+        current = frames[t % 2]
+        if t:
+            previous = frames[(t - 1) % 2]
+            np.take(table, neighborhood_codes(pad_into(previous, padded, boundary), kind, neighborhood),
+                    out=current)
+            if randomness_level > 0:
+                ca_engine.random_events(current, rng, randomness_level)
+        yield {'start': t, 'rows': current.reshape(1, -1), 'frame': current, 'transitions': []}
+
+
+def evolve(initial_frame, table, generations, kind='totalistic', neighborhood='moore', boundary='zero',
+           randomness_level=0.0, rng=None):
+    # (generations, height, width) array of every frame, for small lattices
+    frame = np.asarray(initial_frame)
+    history = np.empty((generations,) + frame.shape, dtype=np.uint8)
+    for block in iter_blocks(frame, table, generations, kind, neighborhood, boundary, randomness_level, rng):
+        history[block['start']] = block['frame']
+    return history
+
+
+class SnapshotWriter(ca_history.HistoryWriter):
+    # Every `every`-th frame as one flattened record of a .cahist file; the header adds 'shape' and
+    # 'every', so record i is generation i * every
+    def __init__(self, path, shape, every=1, bits=2, **metadata):
+        super().__init__(path, shape[0] * shape[1], bits, shape=list(shape), every=every, **metadata)
+        self.every = every
+
+    def update(self, block):
+        if block['start'] % self.every == 0:
+            self.append(block['rows'])
+
+
+class SnapshotReader(ca_history.HistoryReader):
+    def __init__(self, path):
+        super().__init__(path)
+        self.shape = tuple(self.header['shape'])
+        self.every = self.header.get('every', 1)
+
+    def frames(self, start=0, stop=None):
+        # (n, height, width) cells of snapshots start .. stop
+        rows = self.rows(start, stop)
+        return rows.reshape((len(rows),) + self.shape)
+
+    def frame(self, index):
+        return self.frames(index, index + 1)[0]
+
+
+def record(path, initial_frame, table, generations, kind='totalistic', neighborhood='moore', boundary='zero',
+           randomness_level=0.0, rng=None, every=1, bits=2, consumers=(), profiler=None, **header):
+    # Streams a run into a snapshot file, returns the ca_stats.RunStatistics of every generation.
+    # A ca_profile.Profiler times the engine and each consumer, as in ca_sim.stream.
+    frame = np.asarray(initial_frame)
+    writer = SnapshotWriter(path, frame.shape, every, bits, table=as_table(table, kind, neighborhood), kind=kind,
+                            neighborhood=neighborhood, boundary=boundary, randomness_level=randomness_level,
+                            **header)
+    stats = ca_stats.RunStatistics()
+    blocks = iter_blocks(frame, table, generations, kind, neighborhood, boundary, randomness_level, rng)
+    ca_sim.stream(blocks, [writer, stats] + list(consumers), profiler)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the 3-state CA on a 2D lattice, streaming snapshots to disk.")
+    parser.add_argument('--shape', type=int, nargs=2, default=[200, 200], metavar=('HEIGHT', 'WIDTH'))
+    parser.add_argument('--generations', type=int, default=200)
+    parser.add_argument('--neighborhood', choices=list(NEIGHBORHOODS), default='moore')
+    parser.add_argument('--boundary', choices=BOUNDARIES, default='zero',
+                        help="cells past the edge read as 0, or wrap around to the opposite edge")
+    parser.add_argument('--kind', choices=KINDS, default='totalistic', help="what the rule table is indexed by")
+    parser.add_argument('--rule', type=int, help="base-3 rule number (default: drawn from --model)")
+    parser.add_argument('--model', choices=ca_sim.WORLDVIEWS, default='balanced',
+                        help="worldview weights for a drawn rule table")
+    parser.add_argument('--randomness', type=float, default=0.0, help="chance of a random event per cell")
+    parser.add_argument('--init', choices=['center', 'random'], default='random')
+    parser.add_argument('--seed', type=int,
+                        help="root seed; rule table, initial frame and random events each get their own child stream")
+    parser.add_argument('--every', type=int, default=1, help="write every k-th generation to the snapshot file")
+    parser.add_argument('--bits', type=int, choices=[2, 8], default=2)
+    parser.add_argument('--out', default='lattice_run',
+                        help="output prefix for the .cahist snapshots, _stats.npz and a .png of the last snapshot")
+    parser.add_argument('--profile', metavar='TRACE', help="write engine and consumer timings to TRACE (ca_profile)")
+    args = parser.parse_args(argv)
+
+    seed = ca_sim.seed_sequence(args.seed).entropy
+    streams = ca_sim.spawn_streams(seed)
+    shape = tuple(args.shape)
+    if args.rule is None:
+        table = weighted_table(args.kind, args.neighborhood, args.model, streams['rules'])
+    else:
+        table = rule_table(args.rule, args.kind, args.neighborhood)
+    if args.init == 'center':
+        frame = center_frame(shape)
+    else:
+        frame = random_frame(shape, streams['initial_row'])
+    out_dir = os.path.dirname(args.out)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    profiler = None
+    if args.profile:
+        import ca_profile
+        profiler = ca_profile.Profiler().start()
+    path = f"{args.out}{ca_history.EXTENSION}"
+    stats = record(path, frame, table, args.generations, args.kind, args.neighborhood, args.boundary,
+                   args.randomness, streams['events'], args.every, args.bits, profiler=profiler, model=args.model,
+                   seed=seed)
+    stats.save(f"{args.out}_stats.npz")
+    reader = SnapshotReader(path)
+    if reader.generations:
+        last = reader.frame(reader.generations - 1)
+        zoom, stride = ca_render.fit_scale(last.shape)
+        ca_render.write_png(f"{args.out}.png", last, ca_render.PALETTE, zoom, stride)
+    final = stats.counts[-1]
+    print(f"{args.generations} generations of {shape[0]}x{shape[1]} ({args.neighborhood}, {args.boundary}), "
+          f"{reader.generations} snapshots in {path}, final counts struggling={final[0]} stable={final[1]} "
+          f"thriving={final[2]} (--seed {seed})")
+    if profiler is not None:
+        profiler.stop()
+        print(profiler.status_line())
+        print(f"trace written to {profiler.write_trace(args.profile)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import collections
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource  # peak RSS, not on Windows
+except ImportError:
+    resource = None
+
+"""
+Instrumentation for simulation runs: named timers and counters, cells/second per generation block,
+peak memory, and an optional sampling profiler.
+
+A Profiler is handed to ca_sim.stream (and run, run_checkpointed, run_sharded, ca_worker), which
+times the engine producing each block and every consumer's update under its class name. Anything
+else goes in a timer:
+
+    profiler = Profiler(sample_interval=0.005)
+    with profiler:
+        result = ca_sim.run(**ca_sim.prepare('VI', seed=1), profiler=profiler)
+        with profiler.timer('plot'):
+            ca_sim.plot_history(result['history'], 'run.png', 'Phase VI', result['stats'])
+    print(profiler.status_line())
+    profiler.write_trace('run_trace.json')
+
+Timings are at block granularity, so leaving a Profiler on costs a few clock reads per block. Peak
+memory is the process's peak RSS, or with trace_memory=True the tracemalloc peak of the run itself
+(NumPy arrays included), which is exact but slows allocation. With sample_interval, a background
+thread reads every other thread's stack that often (sys._current_frames) and counts them; the
+counts say where the time goes inside a stage.
+
+The trace file is JSON in the Chrome trace-event format (open it in chrome://tracing or Perfetto):
+one complete event per timed call, plus 'summary' (timers, counters, throughput, peak memory, top
+sampled functions), 'blocks' (start, rows, width, seconds, cells/second) and 'stacks'
+(collapsed stacks -> samples, the input format of flamegraph.pl).
+
+The GUI windows show status_line() under the run. CA_PROFILE_SAMPLE=<ms> and CA_PROFILE_MEMORY=1
+in the environment turn on sampling and tracemalloc there (Profiler.from_environment).
+"""
+DEFAULT_SAMPLE_INTERVAL = 0.005
+TOP_FUNCTIONS = 10
+IDLE_FUNCTIONS = {'wait', '_wait_for_tstate_lock', 'mainloop', 'select', 'sleep'}  # blocked, not working
+
+
+class StackSampler(threading.Thread):
+    # Counts the stacks of every other thread, one sample per interval. Threads blocked in one of
+    # IDLE_FUNCTIONS (a join, the Tk main loop waiting for events) are not counted.
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        super().__init__(daemon=True, name='ca_profile sampler')
+        self.interval = interval
+        self.stacks = collections.Counter()  # 'thread;outer;...;inner' -> samples
+        self.leaves = collections.Counter()  # innermost function -> samples
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident or frame.f_code.co_name in IDLE_FUNCTIONS:
+                    continue
+                leaf = f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)})"
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                with self.lock:
+                    self.leaves[leaf] += 1
+                    self.stacks[';'.join([names.get(ident, str(ident))] + stack[::-1])] += 1
+
+    def stop(self):
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
+
+
+class Profiler:
+    def __init__(self, trace_memory=False, sample_interval=None):
+        self.trace_memory = trace_memory
+        self.sample_interval = sample_interval
+        self.timers = {}  # name -> [calls, seconds]
+        self.counters = collections.Counter()
+        self.blocks = []  # (start, rows, width, seconds)
+        self.events = []  # (name, start, seconds, thread id)
+        self.lock = threading.Lock()  # the GUI times the engine thread and the Tk thread together
+        self.origin = time.perf_counter()
+        self.sampler = None
+        self.tracing = False
+        self.peak_traced = None
+
+    @classmethod
+    def from_environment(cls):
+        sample = os.environ.get('CA_PROFILE_SAMPLE')
+        return cls(trace_memory=os.environ.get('CA_PROFILE_MEMORY') == '1',
+                   sample_interval=float(sample) / 1000 if sample else None)
+
+    def start(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+        if self.sample_interval and self.sampler is None:
+            self.sampler = StackSampler(self.sample_interval)
+            self.sampler.start()
+        return self
+
+    def stop(self):
+        if self.sampler is not None:
+            self.sampler.stop()
+        if self.tracing:
+            self.peak_traced = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.tracing = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def add(self, name, start, seconds):
+        with self.lock:
+            entry = self.timers.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            self.events.append((name, start, seconds, threading.get_ident()))
+
+    def timer(self, name):
+        return _Timer(self, name)
+
+    def timed(self, name, function):
+        # function wrapped in timer(name)
+        def call(*args, **kwargs):
+            with self.timer(name):
+                return function(*args, **kwargs)
+        return call
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def record_block(self, block, seconds):
+        rows = block['rows']
+        width = rows.shape[-1] if rows.ndim > 1 else len(rows)
+        with self.lock:
+            self.blocks.append((block['start'], len(rows), width, seconds))
+            self.counters['generations'] += len(rows)
+            self.counters['cells'] += len(rows) * width
+
+    def wrap_blocks(self, blocks, name='engine'):
+        # The block generator with the time spent producing each block recorded
+        blocks = iter(blocks)
+        while True:
+            start = time.perf_counter()
+            try:
+                block = next(blocks)
+            except StopIteration:
+                return
+            seconds = time.perf_counter() - start
+            self.add(name, start, seconds)
+            self.record_block(block, seconds)
+            yield block
+
+    def peak_memory(self):
+        # Bytes: tracemalloc peak with trace_memory, else the process's peak RSS (None if unknown)
+        if self.tracing:
+            return tracemalloc.get_traced_memory()[1]
+        if self.peak_traced is not None:
+            return self.peak_traced
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+    def cells_per_second(self, name='engine'):
+        seconds = self.timers.get(name, (0, 0.0))[1]
+        return self.counters['cells'] / seconds if seconds else 0.0
+
+    def top_functions(self, n=TOP_FUNCTIONS):
+        if self.sampler is None:
+            return []
+        with self.sampler.lock:
+            return self.sampler.leaves.most_common(n)
+
+    def summary(self):
+        with self.lock:
+            timers = {name: {'calls': calls, 'seconds': seconds, 'mean': seconds / calls}
+                      for name, (calls, seconds) in self.timers.items()}
+            counters = dict(self.counters)
+        return {'wall_seconds': time.perf_counter() - self.origin, 'timers': timers, 'counters': counters,
+                'cells_per_second': self.cells_per_second(), 'peak_bytes': self.peak_memory(),
+                'peak_source': 'tracemalloc' if self.trace_memory else 'rss',
+                'top_functions': [[name, samples] for name, samples in self.top_functions()]}
+
+    def status_line(self):
+        # One line for a GUI status panel or the end of a headless run
+        with self.lock:
+            timers = sorted(self.timers.items(), key=lambda item: -item[1][1])
+        parts = [f"{name} {seconds * 1000:.0f} ms" for name, (calls, seconds) in timers]
+        if 'engine' in self.timers:
+            parts.append(f"{self.cells_per_second() / 1e6:.1f} Mcells/s")
+        peak = self.peak_memory()
+        if peak is not None:
+            parts.append(f"peak {peak / 2 ** 20:.0f} MiB")
+        top = self.top_functions(1)
+        if top:
+            parts.append(f"hot: {top[0][0]}")
+        return " | ".join(parts)
+
+    def write_trace(self, path):
+        pid = os.getpid()
+        with self.lock:
+            events = [{'name': name, 'ph': 'X', 'ts': (start - self.origin) * 1e6, 'dur': seconds * 1e6,
+                       'pid': pid, 'tid': tid} for name, start, seconds, tid in self.events]
+            blocks = [{'start': start, 'rows': rows, 'width': width, 'seconds': seconds,
+                       'cells_per_second': rows * width / seconds if seconds else None}
+                      for start, rows, width, seconds in self.blocks]
+        stacks = {}
+        if self.sampler is not None:
+            with self.sampler.lock:
+                stacks = dict(self.sampler.stacks)
+        report = {'traceEvents': events, 'displayTimeUnit': 'ms', 'summary': self.summary(), 'blocks': blocks,
+                  'stacks': stacks}
+        with open(path, 'w') as file:
+            json.dump(report, file)
+        return path
+
+
+class _Timer:
+    # Context manager behind Profiler.timer
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, self.start, time.perf_counter() - self.start)
@@ -0,0 +1,227 @@
+import argparse
+import json
+import os
+import numpy as np
+import ca_engine
+import ca_render
+
+"""
+Level-of-detail pyramid of a CA history, built while the run evolves.
+
+Level k summarizes 2**k x 2**k blocks of cells (generations x cells) as per-class fractions,
+stored as uint8 in 0-255 (one plane per class), plus the majority class of each tile. Level 0 is
+the history itself and is left to the .cahist file; levels 1, 2, ... go into one raw file per
+level in a directory, rows appended as tiles complete:
+
+    <dir>/pyramid.json          width, levels, tile shape per level
+    <dir>/level<k>.frac         (tile_rows, tile_cols, 3) uint8 class fractions
+    <dir>/level<k>.major        (tile_rows, tile_cols) uint8 majority class
+
+PyramidBuilder is a stream consumer (ca_sim.stream). Each level is built from the level below it
+(sum of 2x2 child counts), so the whole pyramid costs about a third more than level 1 alone.
+A viewer picks the level whose tiles are about one screen pixel and reads only the window it shows
+through numpy.memmap (PyramidReader.window).
+"""
+NUM_STATES = ca_engine.NUM_STATES
+CHUNK_ROWS = 64  # generations turned into level 1 tiles at a time, bounds memory for huge blocks
+
+
+class PyramidBuilder:
+    def __init__(self, directory, width, levels=8):
+        self.directory = directory
+        self.width = width
+        self.levels = levels
+        os.makedirs(directory, exist_ok=True)
+        # Per level: carry-over counts for the odd generation waiting for its partner row (level 0: the row itself)
+        self.pending = [None] * (levels + 1)
+        self.rows_written = [0] * (levels + 1)
+        self.files = {}
+        for level in range(1, levels + 1):
+            self.files[level] = (open(self._path(level, 'frac'), 'wb'), open(self._path(level, 'major'), 'wb'))
+        self._write_meta()
+
+    def _path(self, level, kind):
+        return os.path.join(self.directory, f"level{level}.{kind}")
+
+    def _cols(self, level):
+        return -(-self.width // 2 ** level)
+
+    def _write_meta(self):
+        meta = {'width': self.width, 'levels': self.levels,
+                'cols': {level: self._cols(level) for level in range(1, self.levels + 1)}}
+        with open(os.path.join(self.directory, 'pyramid.json'), 'w') as file:
+            json.dump(meta, file)
+
+    def update(self, block):
+        rows = block['rows']
+        for start in range(0, len(rows), CHUNK_ROWS):
+            self._push_rows(rows[start:start + CHUNK_ROWS])
+
+    def _push_rows(self, rows):
+        # Level 1 straight from the cells: 2x2 counts of each class, never a one-hot of the whole block
+        if self.pending[0] is not None:
+            rows = np.concatenate([self.pending[0], rows])
+            self.pending[0] = None
+        if len(rows) % 2:
+            self.pending[0] = rows[-1:].copy()  # blocks may reuse their buffers
+            rows = rows[:-1]
+        if not len(rows):
+            return
+        tiles = np.stack([_pool2x2(rows == state, _count_dtype(1)) for state in range(NUM_STATES)], axis=-1)
+        self._write(1, tiles)
+        self._push(2, tiles)
+
+    def _push(self, level, counts):
+        # counts are (rows, cols, 3) at level-1 resolution; pair them up into level tiles
+        if level > self.levels:
+            return
+        if self.pending[level] is not None:
+            counts = np.concatenate([self.pending[level], counts])
+            self.pending[level] = None
+        if len(counts) % 2:
+            self.pending[level] = counts[-1:]
+            counts = counts[:-1]
+        if not len(counts):
+            return
+        tiles = _pool2x2(counts, _count_dtype(level))
+        self._write(level, tiles)
+        self._push(level + 1, tiles)
+
+    def _write(self, level, tiles):
+        totals = np.maximum(tiles.sum(axis=-1, keepdims=True, dtype=np.uint32), 1)
+        frac = (tiles.astype(np.uint32) * 255 + totals // 2) // totals
+        frac_file, major_file = self.files[level]
+        frac_file.write(frac.astype(np.uint8).tobytes())
+        major_file.write(tiles.argmax(axis=-1).astype(np.uint8).tobytes())
+        self.rows_written[level] += len(tiles)
+
+    def close(self):
+        # Flush the odd trailing rows as half-height tiles so the end of the run is not lost
+        if self.pending[0] is not None:
+            tail, self.pending[0] = self.pending[0], None
+            self._push_rows(np.concatenate([tail, np.full_like(tail, NUM_STATES)]))  # the padding row matches no class
+        for level in range(2, self.levels + 1):
+            if self.pending[level] is not None:
+                tail, self.pending[level] = self.pending[level], None
+                tiles = _pool2x2(np.concatenate([tail, np.zeros_like(tail)]), _count_dtype(level))
+                self._write(level, tiles)
+                self._push(level + 1, tiles)
+        for frac_file, major_file in self.files.values():
+            frac_file.close()
+            major_file.close()
+
+
+def _count_dtype(level):
+    # Smallest unsigned type holding the 4**level cells of a level tile
+    return np.min_scalar_type(4 ** level)
+
+
+def _pool2x2(counts, dtype):
+    # (2n, cols, ...) -> (n, ceil(cols / 2), ...) by summing 2x2 neighborhoods, odd column padded with 0
+    rows, cols = counts.shape[:2]
+    if cols % 2:
+        counts = np.concatenate([counts, np.zeros((rows, 1) + counts.shape[2:], dtype=counts.dtype)], axis=1)
+    return counts.reshape((rows // 2, 2, -1, 2) + counts.shape[2:]).sum(axis=(1, 3), dtype=dtype)
+
+
+class PyramidReader:
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'pyramid.json')) as file:
+            meta = json.load(file)
+        self.width = meta['width']
+        self.levels = meta['levels']
+        self.cols = {int(level): cols for level, cols in meta['cols'].items()}
+
+    def tile_rows(self, level):
+        path = os.path.join(self.directory, f"level{level}.major")
+        return os.path.getsize(path) // self.cols[level]
+
+    def _memmap(self, level, kind):
+        rows = self.tile_rows(level)
+        shape = (rows, self.cols[level], NUM_STATES) if kind == 'frac' else (rows, self.cols[level])
+        if not rows:
+            return np.zeros(shape, dtype=np.uint8)
+        return np.memmap(os.path.join(self.directory, f"level{level}.{kind}"), dtype=np.uint8, mode='r',
+                         shape=shape)
+
+    def level_for(self, generations, cells, screen=(1200, 640)):
+        # Smallest level whose tiles are about one screen pixel for this view
+        scale = max(cells / screen[0], generations / screen[1], 1)
+        return min(self.levels, max(1, int(np.ceil(np.log2(scale)))))
+
+    def window(self, level, gen_start, gen_stop, cell_start, cell_stop, kind='major'):
+        # Tiles covering generations [gen_start, gen_stop) and cells [cell_start, cell_stop),
+        # read from disk only for that window
+        size = 2 ** level
+        data = self._memmap(level, kind)
+        return np.array(data[gen_start // size:-(-gen_stop // size), cell_start // size:-(-cell_stop // size)])
+
+
+def render_view(reader, gen_start, gen_stop, cell_start, cell_stop, screen=ca_render.DISPLAY_SIZE):
+    # Majority-class image of a window, from the coarsest level that still fills the screen
+    level = reader.level_for(gen_stop - gen_start, cell_stop - cell_start, screen)
+    return reader.window(level, gen_start, gen_stop, cell_start, cell_stop), level
+
+
+class PyramidViewer:
+    # Minimal Tk viewer: arrow keys pan, +/- zoom, only the visible tiles are read from disk
+    def __init__(self, master, directory, generations=None):
+        import tkinter as tk
+        self.master = master
+        self.reader = PyramidReader(directory)
+        total = generations or self.reader.tile_rows(1) * 2
+        self.view = [0, total, 0, self.reader.width]  # gen_start, gen_stop, cell_start, cell_stop
+        self.total = total
+        self.label = tk.Label(master)
+        self.label.pack()
+        self.status = tk.Label(master)
+        self.status.pack()
+        for key, move in (('<Left>', (0, -1)), ('<Right>', (0, 1)), ('<Up>', (-1, 0)), ('<Down>', (1, 0))):
+            master.bind(key, lambda event, move=move: self.pan(*move))
+        master.bind('<plus>', lambda event: self.zoom(0.5))
+        master.bind('<equal>', lambda event: self.zoom(0.5))
+        master.bind('<minus>', lambda event: self.zoom(2))
+        self.redraw()
+
+    def pan(self, d_gen, d_cell):
+        g0, g1, c0, c1 = self.view
+        dg, dc = (g1 - g0) // 4 * d_gen, (c1 - c0) // 4 * d_cell
+        dg = max(-g0, min(dg, self.total - g1))
+        dc = max(-c0, min(dc, self.reader.width - c1))
+        self.view = [g0 + dg, g1 + dg, c0 + dc, c1 + dc]
+        self.redraw()
+
+    def zoom(self, factor):
+        g0, g1, c0, c1 = self.view
+        gm, cm = (g0 + g1) // 2, (c0 + c1) // 2
+        gh = max(2, min(int((g1 - g0) * factor) // 2, self.total // 2))
+        ch = max(2, min(int((c1 - c0) * factor) // 2, self.reader.width // 2))
+        gm = min(max(gm, gh), self.total - gh)
+        cm = min(max(cm, ch), self.reader.width - ch)
+        self.view = [gm - gh, gm + gh, cm - ch, cm + ch]
+        self.redraw()
+
+    def redraw(self):
+        tiles, level = render_view(self.reader, *self.view)
+        image = ca_render.to_photoimage(tiles, self.master)
+        self.label.configure(image=image)
+        self.label.image = image
+        g0, g1, c0, c1 = self.view
+        self.status.configure(text=f"generations {g0}-{g1}, cells {c0}-{c1}, level {level} "
+                                   f"({2 ** level}x{2 ** level} tiles)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Browse a history pyramid written with ca_sim.py --pyramid.")
+    parser.add_argument('directory')
+    args = parser.parse_args(argv)
+    import tkinter as tk
+    root = tk.Tk()
+    root.title("CA History Viewer")
+    PyramidViewer(root, args.directory)
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
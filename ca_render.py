@@ -0,0 +1,101 @@
+import struct
+import zlib
+import numpy as np
+
+"""
+Direct rasterizer for CA histories.
+
+State arrays are mapped straight to pixels through a palette lookup (palette[states]), then either
+written as a PNG or handed to a Tk PhotoImage. No matplotlib figure is involved, so drawing a big
+grid costs about as much as copying it. Matplotlib is only used for the distribution charts.
+
+    write_png("phase6.png", history)                       # indexed PNG, one pixel per cell
+    ca_render.show_history(frame, history, title).pack()   # Tk widget with image and legend
+"""
+STATE_NAMES = ['Struggling (0)', 'Stable (1)', 'Thriving (2)']
+STATE_COLORS = ['blue', 'gold', 'green']  # same colors as the ListedColormap in display_ca
+PALETTE = np.array([[0, 0, 255], [255, 215, 0], [0, 128, 0]], dtype=np.uint8)
+BINARY_PALETTE = np.array([[255, 255, 255], [0, 0, 0]], dtype=np.uint8)  # Phase I, cmap='binary'
+TOTALISTIC_PALETTE = np.array([[255, 255, 255], [128, 128, 128], [0, 0, 0]], dtype=np.uint8)
+
+DISPLAY_SIZE = (1200, 640)  # roughly the image area of the old 12x8 inch figure
+
+
+def fit_scale(shape, max_size=DISPLAY_SIZE):
+    # Integer zoom for small grids, integer stride for grids bigger than the display area
+    rows, cols = shape[:2]
+    max_width, max_height = max_size
+    zoom = max(1, min(max_width // max(cols, 1), max_height // max(rows, 1)))
+    stride = max(1, -(-cols // max_width), -(-rows // max_height))
+    return zoom, stride
+
+
+def scale_states(states, zoom=1, stride=1):
+    states = np.asarray(states, dtype=np.uint8)
+    if stride > 1:
+        states = states[::stride, ::stride]
+    if zoom > 1:
+        states = np.repeat(np.repeat(states, zoom, axis=0), zoom, axis=1)
+    return states
+
+
+def to_rgb(states, palette=PALETTE, zoom=1, stride=1):
+    # (rows, cols) states -> (rows, cols, 3) uint8 pixels, one gather through the palette
+    return np.asarray(palette, dtype=np.uint8)[scale_states(states, zoom, stride)]
+
+
+def _png_chunk(kind, data):
+    chunk = kind + data
+    return struct.pack('>I', len(data)) + chunk + struct.pack('>I', zlib.crc32(chunk) & 0xFFFFFFFF)
+
+
+def encode_png(states, palette=PALETTE, zoom=1, stride=1, level=6):
+    # Indexed-color PNG: the state bytes are the pixel data, the palette goes in the PLTE chunk
+    pixels = scale_states(states, zoom, stride)
+    height, width = pixels.shape
+    raw = np.zeros((height, width + 1), dtype=np.uint8)  # filter byte 0 in front of every scanline
+    raw[:, 1:] = pixels
+    header = struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + _png_chunk(b'IHDR', header)
+            + _png_chunk(b'PLTE', np.asarray(palette, dtype=np.uint8).tobytes())
+            + _png_chunk(b'IDAT', zlib.compress(raw.tobytes(), level)) + _png_chunk(b'IEND', b''))
+
+
+def write_png(path, states, palette=PALETTE, zoom=1, stride=1):
+    with open(path, 'wb') as file:
+        file.write(encode_png(states, palette, zoom, stride))
+    return path
+
+
+def to_ppm(rgb):
+    rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
+    height, width = rgb.shape[:2]
+    return f"P6 {width} {height} 255\n".encode('ascii') + rgb.tobytes()
+
+
+def to_photoimage(states, master=None, palette=PALETTE, max_size=DISPLAY_SIZE):
+    # Tk reads binary PPM data directly, so the pixels never pass through matplotlib
+    import tkinter as tk
+    states = np.asarray(states, dtype=np.uint8)
+    zoom, stride = fit_scale(states.shape, max_size)
+    return tk.PhotoImage(master=master, data=to_ppm(to_rgb(states, palette, zoom, stride)), format='PPM')
+
+
+def show_history(parent, states, title=None, palette=PALETTE, names=STATE_NAMES, colors=STATE_COLORS,
+                 max_size=DISPLAY_SIZE):
+    # Frame with the title, the rasterized history and a color legend, ready to pack()
+    import tkinter as tk
+    frame = tk.Frame(parent)
+    if title:
+        tk.Label(frame, text=title, font=('TkDefaultFont', 12)).pack()
+    image = to_photoimage(states, frame, palette, max_size)
+    label = tk.Label(frame, image=image)
+    label.image = image  # Tk drops images nothing in Python refers to
+    label.pack()
+    frame.image_label = label
+    legend = tk.Frame(frame)
+    legend.pack()
+    for name, color in zip(names, colors):
+        tk.Label(legend, text="  ", bg=color).pack(side='left', padx=(10, 2))
+        tk.Label(legend, text=name).pack(side='left')
+    return frame
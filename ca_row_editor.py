@@ -0,0 +1,168 @@
+import tkinter as tk
+from tkinter import filedialog, messagebox
+import numpy as np
+import ca_render
+
+"""
+Single-canvas editor for the initial generation, backed by a NumPy array.
+
+Replaces the one-Spinbox-plus-IntVar-per-cell rows of the CAApp windows. The whole row is one
+PhotoImage on a Canvas, so startup cost does not grow with the number of widgets and widths in the
+tens of thousands scroll horizontally. Click or drag to paint the selected state; pattern fills
+and loading a seed row from a file work on the array directly.
+
+Seed files: .npy (1-D, or the last row of a 2-D history), .cahist/.cadelta (last generation), or text
+with one digit per cell, optionally separated by commas or spaces.
+"""
+STATES = [0, 1, 2]
+ROW_HEIGHT = 24
+MAX_CELL_PX = 12
+VIEW_WIDTH = 1000
+
+
+def load_seed_row(path):
+    if path.endswith('.npy'):
+        row = np.load(path)
+        row = row[-1] if row.ndim == 2 else row
+    elif path.endswith(('.cahist', '.cadelta')):
+        import ca_history
+        reader = ca_history.open_history(path)
+        row = reader.rows(reader.generations - 1)[0]
+    else:
+        with open(path) as file:
+            text = file.read()
+        row = [int(ch) for ch in text if ch.isdigit()]
+    row = np.asarray(row, dtype=np.int64)
+    if row.ndim != 1 or not row.size:
+        raise ValueError(f"{path} does not contain a row of cells")
+    if row.min() < 0 or row.max() > 2:
+        raise ValueError("cells must be 0 (struggling), 1 (stable) or 2 (thriving)")
+    return row.astype(np.uint8)
+
+
+def tile_pattern(pattern, width):
+    digits = [int(ch) for ch in pattern if ch.isdigit()]
+    if not digits or max(digits) > 2:
+        raise ValueError("pattern must be made of the digits 0, 1 and 2")
+    return np.resize(np.array(digits, dtype=np.uint8), width)
+
+
+class RowEditor(tk.Frame):
+    def __init__(self, master, width, **kwargs):
+        super().__init__(master, **kwargs)
+        self.row = np.zeros(width, dtype=np.uint8)
+        self.cell_px = max(1, min(MAX_CELL_PX, VIEW_WIDTH // width))
+        self.brush = tk.IntVar(value=2)
+        self.pattern = tk.StringVar(value="012")
+        self.last_cell = None
+
+        view = min(VIEW_WIDTH, width * self.cell_px)
+        self.canvas = tk.Canvas(self, width=view, height=ROW_HEIGHT, highlightthickness=0,
+                                scrollregion=(0, 0, width * self.cell_px, ROW_HEIGHT))
+        self.canvas.pack(fill='x')
+        if width * self.cell_px > view:
+            scroll = tk.Scrollbar(self, orient=tk.HORIZONTAL, command=self.canvas.xview)
+            scroll.pack(fill='x')
+            self.canvas.configure(xscrollcommand=scroll.set)
+        self.image = tk.PhotoImage(master=self, width=width * self.cell_px, height=ROW_HEIGHT)
+        self.canvas.create_image(0, 0, image=self.image, anchor='nw')
+        self.canvas.bind('<Button-1>', self.on_press)
+        self.canvas.bind('<B1-Motion>', self.on_drag)
+        self.canvas.bind('<ButtonRelease-1>', lambda event: setattr(self, 'last_cell', None))
+
+        tools = tk.Frame(self)
+        tools.pack(pady=2)
+        tk.Label(tools, text="Paint:").pack(side='left')
+        for state, name in zip(STATES, ca_render.STATE_NAMES):
+            tk.Radiobutton(tools, text=name, variable=self.brush, value=state,
+                           fg=ca_render.STATE_COLORS[state]).pack(side='left')
+        tk.Button(tools, text="Fill", command=lambda: self.fill(self.brush.get())).pack(side='left', padx=(10, 2))
+        tk.Entry(tools, textvariable=self.pattern, width=8).pack(side='left')
+        tk.Button(tools, text="Tile Pattern", command=self.fill_pattern).pack(side='left', padx=2)
+        tk.Button(tools, text="Load Row...", command=self.load).pack(side='left', padx=(10, 0))
+        self.redraw()
+
+    @property
+    def width(self):
+        return len(self.row)
+
+    def get_row(self):
+        return self.row.copy()
+
+    def set_row(self, row):
+        row = np.asarray(row, dtype=np.uint8)
+        if row.shape != self.row.shape:
+            raise ValueError(f"row has {row.size} cells, the editor holds {self.width}")
+        self.row[:] = row
+        self.redraw()
+
+    def fill(self, state):
+        self.row[:] = state
+        self.redraw()
+
+    def single_center(self, state):
+        self.row[:] = 0
+        self.row[self.width // 2] = state
+        self.redraw()
+
+    def randomize(self, rng=None):
+        rng = np.random.default_rng() if rng is None else rng
+        self.set_row(rng.integers(0, len(STATES), size=self.width, dtype=np.uint8))
+
+    def fill_pattern(self):
+        try:
+            self.set_row(tile_pattern(self.pattern.get(), self.width))
+        except ValueError as err:
+            messagebox.showwarning("Pattern", str(err))
+
+    def load(self):
+        path = filedialog.askopenfilename(title="Load initial row",
+                                          filetypes=[("Rows", "*.npy *.cahist *.cadelta *.txt *.csv"), ("All files", "*")])
+        if not path:
+            return
+        try:
+            row = load_seed_row(path)
+        except (ValueError, OSError) as err:
+            messagebox.showwarning("Load Row", str(err))
+            return
+        # Center a shorter row, crop a longer one around its middle
+        out = np.zeros(self.width, dtype=np.uint8)
+        n = min(len(row), self.width)
+        src, dst = (len(row) - n) // 2, (self.width - n) // 2
+        out[dst:dst + n] = row[src:src + n]
+        self.set_row(out)
+
+    def redraw(self):
+        pixels = ca_render.to_rgb(self.row[None, :], zoom=1)
+        pixels = np.repeat(np.repeat(pixels, self.cell_px, axis=1), ROW_HEIGHT, axis=0)
+        if self.cell_px > 3:
+            pixels[:, self.cell_px - 1::self.cell_px] = 255  # thin white gap between cells
+        self.image.configure(data=ca_render.to_ppm(pixels), format='PPM')
+
+    def paint(self, first, last):
+        lo, hi = sorted((first, last))
+        lo, hi = max(lo, 0), min(hi, self.width - 1)
+        if lo > hi:
+            return
+        state = self.brush.get()
+        self.row[lo:hi + 1] = state
+        color = '#%02x%02x%02x' % tuple(ca_render.PALETTE[state])
+        x0, x1 = lo * self.cell_px, (hi + 1) * self.cell_px
+        # Only the painted cells are redrawn, a drag never re-encodes the whole row
+        if self.cell_px > 3:
+            for x in range(x0, x1, self.cell_px):
+                self.image.put(color, to=(x, 0, x + self.cell_px - 1, ROW_HEIGHT))
+        else:
+            self.image.put(color, to=(x0, 0, x1, ROW_HEIGHT))
+
+    def cell_at(self, event):
+        return int(self.canvas.canvasx(event.x)) // self.cell_px
+
+    def on_press(self, event):
+        self.last_cell = self.cell_at(event)
+        self.paint(self.last_cell, self.last_cell)
+
+    def on_drag(self, event):
+        cell = self.cell_at(event)
+        self.paint(self.last_cell if self.last_cell is not None else cell, cell)
+        self.last_cell = cell
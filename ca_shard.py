@@ -0,0 +1,181 @@
+import multiprocessing
+import os
+import threading
+from multiprocessing import shared_memory
+import numpy as np
+import ca_engine
+import ca_sim
+import ca_stats
+
+"""
+Sharded runs of one very wide row across worker processes.
+
+The row is cut into contiguous shards, one per worker. The current generation lives twice in a
+shared_memory buffer (read one copy, write the other, swap). Every exchange a worker copies its
+shard plus a halo of k cells on each side, steps that segment k generations on its own (each step
+spoils one more cell at either end, so the shard itself is still exact after k steps), writes the
+shard back and waits on a barrier. halo=1 is the classic one-cell exchange every generation; a
+larger halo trades 2k redundant cells per shard for k times fewer barriers.
+
+Each worker also writes its columns of every generation into a shared block buffer. When a block is
+full the main process copies it out and yields it, so the blocks are the same
+{'start', 'rows', 'reasons', 'transitions'} dicts as ca_sim.iter_blocks and every stream consumer
+works unchanged.
+
+Random events and stochastic rules come out identical to a single-process run with the same rng.
+Both engines draw from the counter-based streams of ca_engine.CellStreams, one Philox stream per
+generation and block of CELL_BLOCK cells, so each worker draws only the blocks under its shard and
+halo. The random draws are split across cores along with the stepping. The caller's rng is not
+advanced.
+
+    for block in iter_blocks_sharded(row, rules, 10000, 0.1, 'phase_vi', rng, workers=8, halo=4):
+        ...
+"""
+DEFAULT_HALO = 1
+
+
+def shard_bounds(width, shards):
+    edges = np.linspace(0, width, shards + 1).astype(int)
+    return [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:])]
+
+
+def _attach(name, shape):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+
+
+def shard_worker(spec, a, b, row_barrier, block_barrier):
+    width, generations, block_size, halo = spec['width'], spec['generations'], spec['block_size'], spec['halo']
+    table, level, overlay = spec['table'], spec['randomness_level'], spec['overlay']
+    handles = []
+    rows = block = reasons = None
+    try:
+        shm, rows = _attach(spec['rows'], (2, width))
+        handles.append(shm)
+        shm, block = _attach(spec['block'], (block_size, width))
+        handles.append(shm)
+        if spec['reasons']:
+            shm, reasons = _attach(spec['reasons'], (block_size, width))
+            handles.append(shm)
+        streams = ca_engine.CellStreams(spec['key']) if spec['key'] is not None else None
+
+        p, t = 0, 1  # rows[p] holds generation t - 1
+        while t < generations:
+            block_start = t // block_size * block_size
+            block_end = min(block_start + block_size, generations)
+            steps = min(halo, block_end - t)
+            lo, hi = max(a - steps, 0), min(b + steps, width)
+            segment = rows[p, lo:hi].copy()
+            for j in range(steps):
+                segment, why = ca_sim.advance(segment, table, level, overlay, streams, t + j, lo)
+                slot = t + j - block_start
+                block[slot, a:b] = segment[a - lo:b - lo]
+                if reasons is not None:
+                    reasons[slot, a:b] = why[a - lo:b - lo]
+            rows[1 - p, a:b] = segment[a - lo:b - lo]
+            row_barrier.wait()  # every shard of the new generation is written
+            p, t = 1 - p, t + steps
+            if t == block_end:
+                block_barrier.wait()  # block full
+                block_barrier.wait()  # main process has copied it
+    except threading.BrokenBarrierError:
+        pass  # another process failed or the run was abandoned
+    except BaseException:
+        row_barrier.abort()
+        block_barrier.abort()
+        raise
+    finally:
+        del rows, block, reasons
+        for shm in handles:
+            shm.close()
+
+
+def iter_blocks_sharded(initial_row, rules, generations, randomness_level=0.0, overlay=None, rng=None,
+                        block_size=ca_sim.DEFAULT_BLOCK_SIZE, workers=None, halo=DEFAULT_HALO, on_cycle=None):
+    # Same blocks as ca_sim.iter_blocks (no cycle detection or light cone, every cell is stepped)
+    if on_cycle:
+        raise ValueError("cycle detection is not available for sharded runs")
+    if halo < 1 or block_size < 1:
+        raise ValueError("halo and block_size must be at least 1")
+    if overlay not in ca_engine.OVERLAYS:
+        raise ValueError(f"unknown overlay {overlay!r}, expected one of {ca_engine.OVERLAYS}")
+    table = ca_engine.as_rules(rules)
+    random = randomness_level > 0 or ca_engine.is_stochastic(table)
+    if ca_engine.is_stochastic(table) and overlay == 'phase_v':
+        raise ValueError("stochastic rules do not combine with the phase_v overlay")
+    row = ca_engine.as_row(initial_row)
+    width = row.shape[-1]
+    streams = None
+    if random:
+        streams = ca_engine.CellStreams.from_rng(np.random.default_rng() if rng is None else rng)
+    shards = shard_bounds(width, max(1, min(workers or os.cpu_count() or 1, width)))
+
+    buffers = {'rows': (2, width), 'block': (block_size, width)}
+    if overlay == 'phase_v':
+        buffers['reasons'] = (block_size, width)
+    memory = {key: shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape))))
+              for key, shape in buffers.items()}
+    arrays = {key: np.ndarray(buffers[key], dtype=np.uint8, buffer=shm.buf) for key, shm in memory.items()}
+    arrays['rows'][0] = row
+    arrays['block'][0] = row
+
+    context = multiprocessing.get_context()
+    row_barrier = context.Barrier(len(shards))
+    block_barrier = context.Barrier(len(shards) + 1)
+    spec = {'width': width, 'generations': generations, 'block_size': block_size, 'halo': halo,
+            'table': table, 'randomness_level': randomness_level, 'overlay': overlay,
+            'key': None if streams is None else streams.key,
+            'rows': memory['rows'].name, 'block': memory['block'].name,
+            'reasons': memory['reasons'].name if 'reasons' in memory else None}
+    processes = [context.Process(target=shard_worker, args=(spec, a, b, row_barrier, block_barrier), daemon=True)
+                 for a, b in shards]
+    for process in processes:
+        process.start()
+
+    try:
+        for start in range(0, generations, block_size):
+            n = min(block_size, generations - start)
+            computed = start + n > max(start, 1)  # block 0 of a one-generation run has nothing to wait for
+            if computed:
+                try:
+                    block_barrier.wait()
+                except threading.BrokenBarrierError:
+                    raise RuntimeError("a shard worker failed, see its traceback above") from None
+            # An uncomputed block is generation 0 alone, which the workers may already be overwriting
+            # with generation 1, so it is taken from the initial row
+            rows = arrays['block'][:n].copy() if computed else row[None, :].copy()
+            first = 1 if start == 0 else 0  # generation 0 has no reasons
+            if 'reasons' in arrays:
+                reasons = arrays['reasons'][first:n].copy()
+            else:
+                reasons = np.zeros((0, width), dtype=np.uint8)
+            transitions = [dict(zip(ca_engine.REASONS, map(int, c))) for c in ca_stats.reason_plane_counts(reasons)]
+            if computed:
+                block_barrier.wait()
+            yield {'start': start, 'rows': rows, 'reasons': reasons, 'transitions': transitions}
+    finally:
+        row_barrier.abort()  # releases the workers if the run stopped early
+        block_barrier.abort()
+        for process in processes:
+            process.join()
+        for array in list(arrays):
+            del arrays[array]
+        for shm in memory.values():
+            shm.close()
+            shm.unlink()
+
+
+def run_sharded(initial_row, rules, generations, randomness_level=0.0, overlay=None, rng=None, keep_reasons=False,
+                workers=None, halo=DEFAULT_HALO, block_size=ca_sim.DEFAULT_BLOCK_SIZE, on_cycle=None, profiler=None):
+    # Same result dict as ca_sim.run
+    width = np.shape(initial_row)[-1]
+    collector = ca_sim.HistoryCollector(generations, width, keep_reasons)
+    stats = ca_stats.RunStatistics()
+    blocks = iter_blocks_sharded(initial_row, rules, generations, randomness_level, overlay, rng, block_size,
+                                 workers, halo, on_cycle)
+    ca_sim.stream(blocks, [collector, stats], profiler)
+    result = {'history': collector.history[:collector.filled], 'rules': rules,
+              'transitions': collector.transitions, 'stats': stats, 'cycle': None}
+    if keep_reasons:
+        result['reasons'] = collector.reason_plane()
+    return result
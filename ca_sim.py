@@ -0,0 +1,590 @@
+import argparse
+import contextlib
+import functools
+import itertools
+import os
+import numpy as np
+import ca_engine
+import ca_history
+import ca_pyramid
+import ca_render
+import ca_stats
+
+"""
+Headless simulation library and batch command line for Phases II-VI.
+
+Everything here is plain Python/NumPy: rule tables, initial rows and random events are passed in
+as values, so nothing reads a tk variable and tkinter is never imported. The CAApp classes in the
+Phase files are thin front-ends that read their widgets once and call run().
+
+Command line example (writes runs/phase6.npy, runs/phase6.png and runs/phase6_distribution.png):
+    python ca_sim.py --phase VI --model optimistic --width 500 --generations 300 --seed 42 --out runs/phase6
+"""
+STATES = [0, 1, 2]
+ALL_COMBINATIONS = list(itertools.product(STATES, repeat=3))
+
+# Phase II: simplified early rules, unlisted combinations default to the center value
+PHASE_II_RULES = {
+    (2, 2, 2): 2,
+    (0, 2, 0): 1,
+    (1, 1, 1): 1,
+    (0, 1, 0): 0,
+}
+
+# Phase III: a basic rule subset for early exploration (not all 27 covered yet)
+PHASE_III_RULES = {
+    (2, 2, 2): 2,
+    (0, 2, 0): 1,
+    (1, 1, 1): 1,
+    (0, 1, 0): 0,
+    (1, 2, 0): 1,
+    (0, 0, 2): 1,
+    (2, 0, 1): 1,
+}
+
+# Phases IV and V: the Phase III subset with all 27 combinations spelled out
+DEFAULT_RULES = dict(PHASE_III_RULES)
+for combo in ALL_COMBINATIONS:
+    if combo not in DEFAULT_RULES:
+        DEFAULT_RULES[combo] = combo[1]
+
+# Phase VI behavioral models: weights for Struggling, Stable, Thriving
+WORLDVIEW_WEIGHTS = {
+    'balanced': [0.3, 0.5, 0.2],  # Mostly stable
+    'pessimistic': [0.45, 0.45, 0.1],  # Mostly struggling
+    'optimistic': [0.15, 0.5, 0.35],  # Mostly stable/thriving
+}
+WORLDVIEWS = list(WORLDVIEW_WEIGHTS)
+
+# Defaults of each phase's GUI. 'rules' is None for Phase VI, whose rules come from a worldview.
+PHASES = {
+    'II': {'title': "Phase 2: 3-State Cellular Automaton", 'rules': PHASE_II_RULES, 'width': 101,
+           'generations': 50, 'randomness': 0.0, 'overlay': None, 'center_state': 2},
+    'III': {'title': "3-State CA: Stochastic Phase", 'rules': PHASE_III_RULES, 'width': 101,
+            'generations': 50, 'randomness': 0.10, 'overlay': None, 'center_state': 1},
+    'IV': {'title': "3-State CA: Deterministic Phase", 'rules': DEFAULT_RULES, 'width': 101,
+           'generations': 50, 'randomness': 0.01, 'overlay': None, 'center_state': 2},
+    'V': {'title': "3-State Cellular Automaton: Human Success Simulation", 'rules': DEFAULT_RULES,
+          'width': 101, 'generations': 50, 'randomness': 0.01, 'overlay': 'phase_v', 'center_state': 2},
+    'VI': {'title': "3-State Cellular Automaton: Human Success Simulation (Phase VI)", 'rules': None,
+           'width': 500, 'generations': 300, 'randomness': 0.1, 'overlay': 'phase_vi', 'center_state': 2},
+}
+DEFAULT_BLOCK_SIZE = 256
+STREAMS = ('rules', 'initial_row', 'events')  # independent child streams spawned from every run's seed
+
+
+def seed_sequence(seed=None):
+    # int, entropy list, SeedSequence, or None for fresh OS entropy (read back from .entropy to replay)
+    return seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+
+def parse_seed(text):
+    # A seed typed into a GUI: blank for fresh entropy (None), else a non-negative integer
+    text = text.strip()
+    if not text:
+        return None
+    try:
+        seed = int(text)
+    except ValueError:
+        seed = None
+    if seed is None or seed < 0:
+        raise ValueError(f"the seed must be blank or a non-negative integer, got {text!r}")
+    return seed
+
+
+def child_seed(seed, index):
+    # The index-th child of seed, equal to seed.spawn()'s but built from the spawn key alone, so any
+    # one child (a sweep job, an ensemble replicate) can be rebuilt without spawning its siblings
+    root = seed_sequence(seed)
+    return np.random.SeedSequence(root.entropy, spawn_key=root.spawn_key + (index,), pool_size=root.pool_size)
+
+
+def spawn_streams(seed=None):
+    # One Generator per consumer of randomness in a run (see STREAMS): drawing more random events
+    # never shifts the rules or the initial row a seed gives, and the other way round
+    root = seed_sequence(seed)
+    return {name: np.random.default_rng(child_seed(root, i)) for i, name in enumerate(STREAMS)}
+
+
+def generate_weighted_rule_set(model='balanced', rng=None):
+    # One weighted draw per neighborhood, unknown models fall back to equal weights
+    rng = np.random.default_rng() if rng is None else rng
+    weights = WORLDVIEW_WEIGHTS.get(model, [1 / 3, 1 / 3, 1 / 3])
+    return {combo: int(rng.choice(STATES, p=weights)) for combo in ALL_COMBINATIONS}
+
+
+def stochastic_rule_set(model='balanced'):
+    # The worldview's weights as stochastic rules: instead of one draw per neighborhood frozen for
+    # the whole run, every cell draws its rule outcome again every generation (ca_engine.sample_step)
+    return ca_engine.rule_probabilities(WORLDVIEW_WEIGHTS.get(model, [1 / 3, 1 / 3, 1 / 3]))
+
+
+def single_center_row(width, state=2):
+    row = np.zeros(width, dtype=np.uint8)
+    row[width // 2] = state
+    return row
+
+
+def random_row(width, rng=None):
+    rng = np.random.default_rng() if rng is None else rng
+    return rng.integers(0, len(STATES), size=width, dtype=np.uint8)
+
+
+def advance(prev, table, randomness_level=0.0, overlay=None, streams=None, generation=0, offset=0):
+    # Generation `generation` from the one before. The second value is Phase V's uint8 reason plane
+    # (overlay 'phase_v'), else None. Random events and stochastic rules draw from streams (a
+    # ca_engine.CellStreams), prev being the cells offset, offset + 1, ... of the run's row.
+    if overlay == 'phase_v':
+        return ca_engine.phase_v_step(prev, table, streams, randomness_level, generation, offset)
+    if ca_engine.is_stochastic(table):
+        uniforms = streams.uniforms(generation, offset, offset + prev.shape[-1])
+        nxt = ca_engine.sample_step(prev, table, uniforms)
+    else:
+        nxt = ca_engine.step(prev, table)
+    if overlay == 'phase_vi':
+        nxt = ca_engine.adjust_rule_result(prev, nxt)
+    elif overlay is not None:
+        raise ValueError(f"unknown overlay {overlay!r}, expected one of {ca_engine.OVERLAYS}")
+    if randomness_level > 0:
+        ca_engine.random_events(nxt, streams, randomness_level, generation, offset)
+    return nxt, None
+
+
+CYCLE_MODES = (None, 'stop', 'replay')
+
+
+def cycle_rows(row, reasons, period, table, overlay=None):
+    # The `period` rows of a cycle starting at `row` (and their reason planes, for Phase V), for replaying
+    rows, planes = [row], [reasons]
+    for _ in range(period - 1):
+        row, reasons = advance(row, table, 0.0, overlay)
+        rows.append(row)
+        planes.append(reasons)
+    return np.array(rows), (None if reasons is None else np.array(planes))
+
+
+def describe_cycle(cycle):
+    if cycle is None:
+        return "no repeated row"
+    if cycle['period'] == 1:
+        return f"fixed point from generation {cycle['transient']}"
+    return f"period-{cycle['period']} cycle from generation {cycle['transient']}"
+
+
+def iter_blocks(initial_row, rules, generations, randomness_level=0.0, overlay=None, rng=None,
+                block_size=DEFAULT_BLOCK_SIZE, on_cycle=None, start=0, offset=0):
+    # Streaming mode: yields {'start', 'rows', 'reasons', 'transitions'} for each run of up to
+    # block_size generations, so memory stays O(width x block_size) however long the run is.
+    # For Phase V, 'reasons' is the (transitions, width) reason plane of the generations in the block
+    # (generation 0 has none) and 'transitions' their per-generation counts; both are empty otherwise.
+    # rules may also be stochastic (a (27, 3) probability matrix, see ca_engine.rule_probabilities):
+    # every cell then samples its next state each generation.
+    # Random draws come from counter-based streams keyed by rng (ca_engine.CellStreams.from_rng), so
+    # rng is not advanced and a run depends only on its state; the sharded engine draws the same.
+    # With offset the row draws as the cells offset, offset + 1, ... of those streams (one replicate
+    # of a ca_ensemble stack).
+    # on_cycle only matters without random events or stochastic rules, when every row is a pure
+    # function of the one before: rows are hashed (ca_engine.CycleDetector) and at the first repeat
+    # 'stop' ends the run just before the repeated row, 'replay' fills the remaining generations by
+    # copying the cycle instead of stepping. The block that finds the repeat carries
+    # 'cycle': {'transient', 'period'}.
+    # With start > 0 the run resumes: initial_row is generation start - 1 and the first block begins
+    # at generation start (see ca_checkpoint).
+    # Without random events and with a rule table that keeps a zero background at zero, only the
+    # light cone of the non-zero cells is stepped each generation (ca_engine.light_cone); rows are unchanged.
+    table = ca_engine.as_rules(rules)
+    stochastic = ca_engine.is_stochastic(table)
+    row = ca_engine.as_row(initial_row)
+    streams = None
+    if randomness_level > 0 or stochastic:
+        streams = ca_engine.CellStreams.from_rng(np.random.default_rng() if rng is None else rng)
+    if stochastic and overlay == 'phase_v':
+        raise ValueError("stochastic rules do not combine with the phase_v overlay")
+    if block_size < 1:
+        raise ValueError("block_size must be at least 1")
+    if on_cycle not in CYCLE_MODES:
+        raise ValueError(f"unknown on_cycle {on_cycle!r}, expected one of {CYCLE_MODES}")
+    if on_cycle and start:
+        raise ValueError("cycle detection needs the run from generation 0, it cannot resume")
+    deterministic = randomness_level == 0 and not stochastic
+    detector = ca_engine.CycleDetector() if on_cycle and deterministic else None
+    window = None
+    if deterministic and row.ndim == 1 and ca_engine.is_quiescent(table):
+        window = ca_engine.active_window(row)
+    replay = None  # (generation the replay is anchored at, cycle rows, cycle reason planes)
+
+    while start < generations:
+        n = min(block_size, generations - start)
+        # Fresh buffer, consumers may keep it. Zeroed when only the light cone gets written.
+        rows = (np.empty if window is None else np.zeros)((n, row.shape[-1]), dtype=np.uint8)
+        planes = []
+        cycle = None
+        for i in range(n):
+            reasons, written = None, False
+            if replay is not None:
+                anchor, loop_rows, loop_planes = replay
+                k = (start + i - anchor) % len(loop_rows)
+                row = loop_rows[k]
+                reasons = None if loop_planes is None else loop_planes[k]
+            elif start + i and window is not None:
+                a, b = ca_engine.light_cone(window, row.shape[-1])
+                cone, cone_reasons = advance(row[a:b], table, 0.0, overlay)
+                rows[i, a:b] = cone
+                if cone_reasons is not None:
+                    reasons = np.zeros(row.shape[-1], dtype=np.uint8)  # REASON_RULE outside the cone
+                    reasons[a:b] = cone_reasons
+                window = ca_engine.active_window(cone, a)
+                row, written = rows[i], True
+            elif start + i:
+                row, reasons = advance(row, table, randomness_level, overlay, streams, start + i, offset)
+            if detector is not None and replay is None:
+                first = detector.see(row, start + i)
+                if first is not None:
+                    cycle = {'transient': first, 'period': start + i - first}
+                    if on_cycle == 'stop':
+                        n = i
+                        break
+                    replay = (start + i,) + cycle_rows(row, reasons, cycle['period'], table, overlay)
+            if reasons is not None:
+                planes.append(reasons)
+            if not written:
+                rows[i] = row
+        rows = rows[:n]
+        reasons = np.array(planes, dtype=np.uint8).reshape(len(planes), row.shape[-1])
+        transitions = [dict(zip(ca_engine.REASONS, map(int, c))) for c in ca_stats.reason_plane_counts(reasons)]
+        block = {'start': start, 'rows': rows, 'reasons': reasons, 'transitions': transitions}
+        if cycle is not None:
+            block['cycle'] = cycle
+        yield block
+        if cycle is not None and on_cycle == 'stop':
+            return
+        start += n
+
+
+def iter_rows(initial_row, rules, generations, randomness_level=0.0, overlay=None, rng=None):
+    for block in iter_blocks(initial_row, rules, generations, randomness_level, overlay, rng, block_size=1):
+        yield block['rows'][0]
+
+
+def stream(blocks, consumers, profiler=None):
+    # Feed every block to each consumer's update(block), then call close() on those that have one.
+    # With a ca_profile.Profiler the engine ('engine') and every consumer (by class name) are timed.
+    updates = [consumer.update for consumer in consumers]
+    if profiler is not None:
+        blocks = profiler.wrap_blocks(blocks)
+        updates = [profiler.timed(type(consumer).__name__, consumer.update) for consumer in consumers]
+    for block in blocks:
+        for update in updates:
+            update(block)
+    for consumer in consumers:
+        if hasattr(consumer, 'close'):
+            if profiler is None:
+                consumer.close()
+            else:
+                profiler.timed(f"{type(consumer).__name__}.close", consumer.close)()
+    return consumers
+
+
+class StrideSampler:
+    # Keeps every stride-th generation, e.g. for a downsampled picture of a very long run
+    def __init__(self, stride):
+        self.stride = stride
+        self.rows = []
+
+    def update(self, block):
+        first = -block['start'] % self.stride
+        self.rows.append(block['rows'][first::self.stride])
+
+    def history(self):
+        return np.concatenate(self.rows) if self.rows else np.zeros((0, 0), dtype=np.uint8)
+
+
+class HistoryCollector:
+    # Keeps everything: what run() uses to return the full history (and Phase V's reason plane)
+    def __init__(self, generations, width, keep_reasons=False):
+        self.history = np.empty((generations, width), dtype=np.uint8)
+        self.filled = 0  # fewer than generations when the run stopped at a cycle
+        self.cycle = None
+        self.transitions = []
+        self.reasons = [] if keep_reasons else None
+
+    def update(self, block):
+        self.filled = block['start'] + len(block['rows'])
+        self.history[block['start']:self.filled] = block['rows']
+        self.cycle = block.get('cycle', self.cycle)
+        self.transitions.extend(block['transitions'])
+        if self.reasons is not None and len(block['reasons']):
+            self.reasons.append(block['reasons'])
+
+    def reason_plane(self):
+        if not self.reasons:
+            return np.zeros((0, self.history.shape[1]), dtype=np.uint8)
+        return np.concatenate(self.reasons)
+
+
+def run(initial_row, rules, generations, randomness_level=0.0, overlay=None, rng=None, keep_reasons=False,
+        on_cycle=None, profiler=None, offset=0):
+    # Evolve one run. 'transitions' holds Phase V's per-generation reason counts (overlay 'phase_v'),
+    # 'stats' the ca_stats.RunStatistics gathered while evolving. With keep_reasons, 'reasons' is the
+    # (generations - 1, width) uint8 reason plane, codes as in ca_engine.REASONS. 'cycle' is the
+    # first repeated row found with on_cycle (see iter_blocks), None otherwise. offset as in iter_blocks.
+    width = np.shape(initial_row)[-1]
+    collector = HistoryCollector(generations, width, keep_reasons)
+    stats = ca_stats.RunStatistics()
+    stream(iter_blocks(initial_row, rules, generations, randomness_level, overlay, rng, on_cycle=on_cycle,
+                       offset=offset),
+           [collector, stats], profiler)
+    result = {'history': collector.history[:collector.filled], 'rules': rules,
+              'transitions': collector.transitions, 'stats': stats, 'cycle': collector.cycle}
+    if keep_reasons:
+        result['reasons'] = collector.reason_plane()
+    return result
+
+
+def prepare(phase, initial_row=None, width=None, generations=None, randomness_level=None,
+            model='balanced', seed=None, init='center', stochastic_rules=False):
+    # Resolve a phase's GUI defaults into the keyword arguments of run() / iter_blocks().
+    # stochastic_rules: Phase VI samples the worldview every generation (stochastic_rule_set).
+    if phase not in PHASES:
+        raise ValueError(f"unknown phase {phase!r}, expected one of {list(PHASES)}")
+    config = PHASES[phase]
+    if stochastic_rules and config['rules'] is not None:
+        raise ValueError("stochastic rules come from a Phase VI worldview")
+    streams = spawn_streams(seed)
+    width = config['width'] if width is None else width
+    generations = config['generations'] if generations is None else generations
+    randomness_level = config['randomness'] if randomness_level is None else randomness_level
+
+    rules = config['rules']
+    if rules is None and stochastic_rules:
+        rules = stochastic_rule_set(model)
+    elif rules is None:
+        rules = generate_weighted_rule_set(model, streams['rules'])
+    if initial_row is None:
+        if init == 'center':
+            initial_row = single_center_row(width, config['center_state'])
+        elif init == 'random':
+            initial_row = random_row(width, streams['initial_row'])
+        else:
+            raise ValueError(f"unknown init {init!r}, expected 'center' or 'random'")
+
+    return {'initial_row': initial_row, 'rules': rules, 'generations': generations,
+            'randomness_level': randomness_level, 'overlay': config['overlay'], 'rng': streams['events']}
+
+
+def simulate(phase, initial_row=None, width=None, generations=None, randomness_level=None,
+             model='balanced', seed=None, init='center', cache=None, stochastic_rules=False):
+    # Run a phase with its GUI defaults, overriding whatever is passed in. With a ca_cache.ResultCache
+    # a seeded (or deterministic) configuration is only ever computed once. 'seed_entropy' in the
+    # result replays the run, also when no seed was given.
+    root = seed_sequence(seed)
+    params = prepare(phase, initial_row, width, generations, randomness_level, model, root, init, stochastic_rules)
+    result = run(**params) if cache is None else dict(cache.run(**params))
+    result.update(phase=phase, model=model if phase == 'VI' else None, seed=seed, seed_entropy=root.entropy,
+                  spawn_key=root.spawn_key, randomness_level=params['randomness_level'])
+    return result
+
+
+def plot_history(history, path, title, stats=None):
+    # CA image rasterized straight to <path> (ca_render), the charts drawn with matplotlib's Agg
+    # backend into <path stem>_distribution.png, so no display is needed
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    ca_render.write_png(path, history)
+    if stats is None:
+        stats = ca_stats.RunStatistics()
+        stats.update({'rows': history})
+    counts, reasons = stats.counts, stats.reasons
+    n_panels = 2 if len(reasons) else 1
+    fig, axs = plt.subplots(n_panels, 1, figsize=(12, 2.5 * n_panels + 0.5), squeeze=False)
+    axs = axs[:, 0]
+    fig.suptitle(title)
+
+    for s, color, name in zip(STATES, ca_render.STATE_COLORS, ca_render.STATE_NAMES):
+        axs[0].plot(counts[:, s], color=color, label=name)
+    axs[0].set_title("State Distribution Over Time")
+    axs[0].set_xlabel("Generation")
+    axs[0].set_ylabel("Count")
+    axs[0].legend(loc='upper right')
+
+    if len(reasons):
+        for i, reason in enumerate(ca_engine.REASONS):
+            axs[1].plot(reasons[:, i], label=reason)
+        axs[1].legend()
+        axs[1].set_xlabel("Generation")
+        axs[1].set_ylabel("Count")
+
+    fig.tight_layout()
+    fig.savefig(f"{os.path.splitext(path)[0]}_distribution.png")
+    plt.close(fig)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run a Human Success CA phase without the GUI.")
+    parser.add_argument('--phase', choices=list(PHASES), default='VI')
+    parser.add_argument('--width', type=int, help="cells per row (default: the phase's CA_WIDTH)")
+    parser.add_argument('--generations', type=int, help="rows to compute (default: the phase's NUM_GENERATIONS)")
+    parser.add_argument('--randomness', type=float, help="chance of a random event per cell, 0 disables them")
+    parser.add_argument('--model', choices=WORLDVIEWS, default='balanced', help="Phase VI worldview")
+    parser.add_argument('--stochastic-rules', action='store_true',
+                        help="Phase VI: every cell draws its rule outcome from the worldview weights each "
+                             "generation, instead of one rule set drawn for the whole run")
+    parser.add_argument('--seed', type=int,
+                        help="root seed; rules, initial row and random events each get their own child stream")
+    parser.add_argument('--init', choices=['center', 'random'], default='center',
+                        help="single thriving center or a random initial row")
+    parser.add_argument('--out', default='ca_run',
+                        help="output prefix for the .npy history, .png image and _distribution.png chart")
+    parser.add_argument('--no-plot', action='store_true', help="only write the history array")
+    parser.add_argument('--stride', type=int,
+                        help="streaming mode: keep only every stride-th generation in memory and in the "
+                             ".npy, statistics for every generation still go to <out>_stats.npz")
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                        help="generations computed per streamed block")
+    parser.add_argument('--format', choices=['npy', 'cahist', 'cadelta'], default='npy',
+                        help="history output: .npy array, or every generation streamed to a .cahist file "
+                             "(or a delta/run-length compressed .cadelta file)")
+    parser.add_argument('--keyframe-every', type=int, default=256,
+                        help="with --format cadelta: generations per self-contained chunk")
+    parser.add_argument('--bits', type=int, choices=[2, 8], default=2, help="bits per cell in a .cahist file")
+    parser.add_argument('--pyramid', metavar='DIR',
+                        help="also build a level-of-detail pyramid of the history in DIR (view with ca_pyramid.py)")
+    parser.add_argument('--pyramid-levels', type=int, default=8, help="2x2 ... 2^k x 2^k tile levels")
+    parser.add_argument('--reasons', action='store_true',
+                        help="Phase V: also store why every cell changed, as <out>_reasons.npy/.cahist")
+    parser.add_argument('--cache', nargs='?', const=True, metavar='DIR',
+                        help="reuse results of identical seeded runs (default dir: $CA_CACHE_DIR or "
+                             "~/.cache/human_success_ca); only for full in-memory runs")
+    parser.add_argument('--checkpoint', metavar='PATH',
+                        help="with --format cahist: save progress to PATH every --checkpoint-every "
+                             "generations, and resume from it if it exists")
+    parser.add_argument('--checkpoint-every', type=int, default=1000)
+    parser.add_argument('--shards', type=int,
+                        help="split the row across this many worker processes (same rows as one process)")
+    parser.add_argument('--halo', type=int, default=1,
+                        help="with --shards: cells exchanged per side, i.e. generations between barriers")
+    parser.add_argument('--on-cycle', choices=['stop', 'replay'],
+                        help="without random events, detect the first repeated row and stop there or "
+                             "fill the rest of the run by replaying the cycle")
+    parser.add_argument('--profile', metavar='TRACE',
+                        help="time the engine, every consumer and the output stages and write them to TRACE "
+                             "as Chrome trace-event JSON (see ca_profile)")
+    parser.add_argument('--profile-sample', type=float, nargs='?', const=5.0, metavar='MS',
+                        help="also sample the Python stacks every MS milliseconds (default 5)")
+    parser.add_argument('--profile-memory', action='store_true',
+                        help="report the tracemalloc peak instead of the process's peak RSS (slower)")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.generations is not None and args.generations < 1:
+        parser.error("--generations must be at least 1")
+    if args.checkpoint and (args.format != 'cahist' or args.pyramid or args.on_cycle):
+        parser.error("--checkpoint needs --format cahist and does not combine with --pyramid or --on-cycle")
+    if args.format == 'cadelta' and args.bits != 2:
+        parser.error("--format cadelta stores 2 bits per cell")
+    if args.stochastic_rules and args.phase != 'VI':
+        parser.error("--stochastic-rules needs --phase VI")
+    if args.shards and (args.on_cycle or args.checkpoint or args.cache):
+        parser.error("--shards does not combine with --on-cycle, --checkpoint or --cache")
+    if args.cache and (args.format != 'npy' or args.stride):
+        parser.error("--cache only applies to full in-memory runs (--format npy without --stride)")
+    blocks = iter_blocks
+    if args.shards:
+        import ca_shard
+        blocks = functools.partial(ca_shard.iter_blocks_sharded, workers=args.shards, halo=args.halo)
+    seed = seed_sequence(args.seed).entropy  # without --seed, fresh entropy that is printed for replaying
+    params = prepare(args.phase, width=args.width, generations=args.generations,
+                     randomness_level=args.randomness, model=args.model, seed=seed, init=args.init,
+                     stochastic_rules=args.stochastic_rules)
+    params['on_cycle'] = args.on_cycle
+    out_dir = os.path.dirname(args.out)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    profiler = None
+    if args.profile or args.profile_sample or args.profile_memory:
+        import ca_profile
+        profiler = ca_profile.Profiler(args.profile_memory, args.profile_sample and args.profile_sample / 1000).start()
+    timer = profiler.timer if profiler is not None else lambda name: contextlib.nullcontext()
+
+    extra = []
+    if args.pyramid:
+        extra.append(ca_pyramid.PyramidBuilder(args.pyramid, len(params['initial_row']), args.pyramid_levels))
+    if args.checkpoint:
+        import ca_checkpoint
+        path = f"{args.out}{ca_history.EXTENSION}"
+        stats = ca_checkpoint.run_checkpointed(
+            params, path, args.checkpoint, args.checkpoint_every,
+            f"{args.out}_reasons{ca_history.EXTENSION}" if args.reasons else None, args.block_size, args.bits,
+            phase=args.phase, model=args.model if args.phase == 'VI' else None, seed=seed,
+            randomness_level=params['randomness_level'], profiler=profiler)
+        sampler = StrideSampler(args.stride or 1)
+        if not args.no_plot:  # the picture covers the whole run, also the part before a resume
+            with timer('read back'):
+                stream(ca_history.HistoryReader(path).iter_blocks(), [sampler])
+        history = sampler.history()
+    elif args.format in ('cahist', 'cadelta'):
+        # Full history goes straight to disk as it is computed, memory only holds one block
+        writer_class, extension = ca_history.HistoryWriter, ca_history.EXTENSION
+        if args.format == 'cadelta':
+            import ca_delta
+            writer_class = functools.partial(ca_delta.DeltaWriter, keyframe_every=args.keyframe_every)
+            extension = ca_delta.EXTENSION
+        writer = writer_class(f"{args.out}{extension}", len(params['initial_row']), bits=args.bits,
+                              rules=params['rules'], phase=args.phase,
+                              model=args.model if args.phase == 'VI' else None, seed=seed,
+                              randomness_level=params['randomness_level'])
+        stats, sampler = ca_stats.RunStatistics(), StrideSampler(args.stride or 1)
+        consumers = [writer, stats] + extra + ([] if args.no_plot else [sampler])
+        if args.reasons:
+            consumers.append(writer_class(f"{args.out}_reasons{extension}", len(params['initial_row']), bits=2,
+                                          key='reasons', phase=args.phase, seed=seed))
+        stream(blocks(**params, block_size=args.block_size), consumers, profiler)
+        history = sampler.history()
+    elif args.stride:
+        stats, sampler = ca_stats.RunStatistics(), StrideSampler(args.stride)
+        stream(blocks(**params, block_size=args.block_size), [stats, sampler] + extra, profiler)
+        history = sampler.history()
+    else:
+        if args.cache:
+            import ca_cache
+            cache = ca_cache.ResultCache() if args.cache is True else ca_cache.ResultCache(args.cache)
+            with timer('cache'):
+                result = cache.run(**params, keep_reasons=args.reasons)
+        elif args.shards:
+            result = ca_shard.run_sharded(**params, keep_reasons=args.reasons, workers=args.shards, halo=args.halo,
+                                          block_size=args.block_size, profiler=profiler)
+        else:
+            result = run(**params, keep_reasons=args.reasons, profiler=profiler)
+        history, stats = result['history'], result['stats']
+        if extra:
+            with timer('pyramid'):
+                stream([{'start': 0, 'rows': history}], extra)
+        if args.reasons:
+            with timer('save'):
+                np.save(f"{args.out}_reasons.npy", result['reasons'])
+    with timer('save'):
+        stats.save(f"{args.out}_stats.npz")
+        if args.format == 'npy':
+            np.save(f"{args.out}.npy", history)
+    final = stats.counts[-1]
+    if not args.no_plot:
+        with timer('plot'):
+            plot_history(history, f"{args.out}.png", PHASES[args.phase]['title'], stats)
+    print(f"Phase {args.phase}: {len(stats.counts)} generations x {len(params['initial_row'])} cells, "
+          f"final counts struggling={final[0]} stable={final[1]} thriving={final[2]} (--seed {seed})")
+    if args.on_cycle:
+        print(describe_cycle(stats.cycle))
+    if profiler is not None:
+        profiler.stop()
+        print(profiler.status_line())
+        if args.profile:
+            print(f"trace written to {profiler.write_trace(args.profile)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import numpy as np
+import ca_engine
+
+"""
+Incremental per-generation statistics, updated while a run evolves.
+
+RunStatistics is a stream consumer (see ca_sim.stream): every block of rows is reduced with
+np.bincount as soon as it is computed, so plots and analysis read O(generations) arrays instead of
+going back over the stored history with row.count.
+
+    counts    (generations, 3)        cells in each class per generation
+    mobility  (generations - 1, 3, 3) mobility[t, a, b] = cells that went from class a to class b
+                                      between generation t and t + 1
+    reasons   (generations - 1, 4)    Phase V reason counts in ca_engine.REASONS order
+    cycle     {'transient', 'period'} of a deterministic run that repeated a row, else None
+"""
+NUM_STATES = ca_engine.NUM_STATES
+
+
+def row_counts(rows):
+    # (n, width) -> (n, 3): one bincount over all rows, each row offset into its own bins
+    rows = np.asarray(rows)
+    n = rows.shape[0]
+    offsets = (np.arange(n) * NUM_STATES)[:, None]
+    counts = np.bincount((rows + offsets).ravel(), minlength=n * NUM_STATES)
+    return counts.reshape(n, NUM_STATES)
+
+
+def mobility_matrices(prev_rows, next_rows):
+    # (n, width) pairs -> (n, 3, 3) previous class -> new class counts
+    prev_rows = np.asarray(prev_rows, dtype=np.intp)
+    n = prev_rows.shape[0]
+    bins = NUM_STATES * NUM_STATES
+    codes = NUM_STATES * prev_rows + next_rows + (np.arange(n) * bins)[:, None]
+    counts = np.bincount(codes.ravel(), minlength=n * bins)
+    return counts.reshape(n, NUM_STATES, NUM_STATES)
+
+
+def reason_array(transitions):
+    return np.array([[t[reason] for reason in ca_engine.REASONS] for t in transitions], dtype=np.int64)
+
+
+def reason_plane_counts(reasons):
+    # (n, width) uint8 reason plane -> (n, 4) counts, one bincount like row_counts
+    reasons = np.asarray(reasons)
+    n = reasons.shape[0]
+    bins = len(ca_engine.REASONS)
+    counts = np.bincount((reasons + (np.arange(n) * bins)[:, None]).ravel(), minlength=n * bins)
+    return counts.reshape(n, bins)
+
+
+def _concat(parts, shape):
+    return np.concatenate(parts) if parts else np.zeros((0,) + shape, dtype=np.int64)
+
+
+class RunStatistics:
+    def __init__(self):
+        self._counts = []
+        self._mobility = []
+        self._reasons = []
+        self.last_row = None
+        self.cycle = None
+
+    def update(self, block):
+        rows = block['rows']
+        self.cycle = block.get('cycle', self.cycle)
+        if not len(rows):
+            return
+        self._counts.append(row_counts(rows))
+        # The first transition of a block starts from the last row of the previous block
+        if self.last_row is not None:
+            self._mobility.append(mobility_matrices(self.last_row[None, :], rows[:1]))
+        if len(rows) > 1:
+            self._mobility.append(mobility_matrices(rows[:-1], rows[1:]))
+        self.last_row = rows[-1].copy()
+        reasons = block.get('reasons')
+        if reasons is not None and len(reasons):
+            self._reasons.append(reason_plane_counts(reasons))
+        elif block.get('transitions'):
+            self._reasons.append(reason_array(block['transitions']))
+
+    @property
+    def counts(self):
+        return _concat(self._counts, (NUM_STATES,))
+
+    @property
+    def mobility(self):
+        return _concat(self._mobility, (NUM_STATES, NUM_STATES))
+
+    @property
+    def reasons(self):
+        return _concat(self._reasons, (len(ca_engine.REASONS),))
+
+    def total_mobility(self):
+        # Whole-run class mobility matrix
+        return self.mobility.sum(axis=0)
+
+    def arrays(self):
+        cycle = [] if self.cycle is None else [self.cycle['transient'], self.cycle['period']]
+        return {'counts': self.counts, 'mobility': self.mobility, 'reasons': self.reasons,
+                'cycle': np.array(cycle, dtype=np.int64)}
+
+    @classmethod
+    def from_arrays(cls, counts, mobility, reasons, cycle=()):
+        # Inverse of arrays(), e.g. for statistics read back from disk (no last_row, so no more updates)
+        stats = cls()
+        stats._counts, stats._mobility, stats._reasons = [np.asarray(counts)], [np.asarray(mobility)], [np.asarray(reasons)]
+        if len(cycle):
+            stats.cycle = {'transient': int(cycle[0]), 'period': int(cycle[1])}
+        return stats
+
+    def save(self, path):
+        np.savez(path, **self.arrays())
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls.from_arrays(**{key: data[key] for key in data.files})
@@ -0,0 +1,155 @@
+import argparse
+import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import ca_sim
+
+"""
+Process-pool parameter sweep over Phase VI worldviews, randomness levels and seeds.
+
+The grid (worldview x randomness level x replicate) is split into chunks handed to a bounded
+ProcessPoolExecutor. Every job gets its own RNG stream spawned from one root SeedSequence by its
+(model, randomness, replicate) key, so a job's result does not depend on which worker ran it or in what order.
+Each finished job is appended to a CSV results table; rerunning skips every (model, randomness,
+replicate) already in the table, so an interrupted or enlarged sweep resumes where it stopped. Every
+row records the root seed, width, generations and init it ran with, and a table holding rows with
+other settings is refused instead of resumed.
+
+    python ca_sweep.py --models balanced pessimistic optimistic --randomness 0 0.05 0.1 \\
+        --replicates 20 --workers 4 --out sweep.csv
+"""
+FIELDS = ['phase', 'model', 'randomness', 'replicate', 'seed_entropy', 'width', 'generations',
+          'init', 'share_struggling', 'share_stable', 'share_thriving', 'absorbed_at']
+
+
+def build_jobs(models, randomness_levels, replicates, phase='VI'):
+    # A job is identified by its (model, randomness, replicate) key alone (job_key), never by its
+    # position in the grid, which changes when the grid is reordered or extended
+    return [{'phase': phase, 'model': model, 'randomness': level, 'replicate': rep}
+            for model, level, rep in itertools.product(models, randomness_levels, range(replicates))]
+
+
+def absorption_time(history):
+    # First generation after which the row never changes again, -1 if it is still changing at the end
+    if len(history) < 2:
+        return -1
+    changed = np.any(history[1:] != history[:-1], axis=1)
+    if changed[-1]:
+        return -1
+    moving = np.flatnonzero(changed)
+    return int(moving[-1]) + 1 if moving.size else 0
+
+
+def summarize(job, history, root_entropy, init):
+    final = np.bincount(history[-1], minlength=3) / history.shape[1]
+    return dict(job, seed_entropy=root_entropy, width=history.shape[1], generations=history.shape[0], init=init,
+                share_struggling=float(final[0]), share_stable=float(final[1]),
+                share_thriving=float(final[2]), absorbed_at=absorption_time(history))
+
+
+def job_key(job):
+    return job['model'], float(job['randomness']), int(job['replicate'])
+
+
+def job_seed(job, root_entropy):
+    # Child stream keyed by what the job is, not where it sits in the grid: independent of every
+    # other job and replayable on its own
+    model, level, rep = job_key(job)
+    return np.random.SeedSequence(root_entropy, spawn_key=(ca_sim.WORLDVIEWS.index(model),
+                                                          int(round(level * 10 ** 6)), rep))
+
+
+def run_job(job, root_entropy, width, generations, init):
+    seed = job_seed(job, root_entropy)
+    result = ca_sim.simulate(job['phase'], width=width, generations=generations,
+                             randomness_level=job['randomness'], model=job['model'],
+                             seed=seed, init=init)
+    return summarize(job, result['history'], root_entropy, init)
+
+
+def run_chunk(chunk, root_entropy, width, generations, init):
+    return [run_job(job, root_entropy, width, generations, init) for job in chunk]
+
+
+def sweep_settings(root_entropy, width=None, generations=None, init='center', phase='VI'):
+    # The columns every row of one sweep shares, as they read back from the CSV
+    config = ca_sim.PHASES[phase]
+    return {'seed_entropy': str(root_entropy), 'width': str(width or config['width']),
+            'generations': str(generations or config['generations']), 'init': init}
+
+
+def completed_jobs(path, settings=None):
+    # Keys of the jobs already in the table; with settings, a row run with other settings is an error
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, newline="") as file:
+        for row in csv.DictReader(file):
+            for field, value in (settings or {}).items():
+                if row.get(field) != value:
+                    raise ValueError(f"{path} holds a sweep run with {field}={row.get(field)}, not {value}; "
+                                     f"write to another file to start a new sweep")
+            done.add(job_key(row))
+    return done
+
+
+def chunked(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def run_sweep(jobs, out_path, root_entropy=0, width=None, generations=None, init='center',
+              workers=None, chunk_size=None):
+    phase = jobs[0]['phase'] if jobs else 'VI'
+    done = completed_jobs(out_path, sweep_settings(root_entropy, width, generations, init, phase))
+    pending = [job for job in jobs if job_key(job) not in done]
+    if not pending:
+        return out_path
+    workers = workers or os.cpu_count() or 1
+    chunk_size = chunk_size or max(1, len(pending) // (workers * 4))
+
+    new_file = not os.path.exists(out_path)
+    with open(out_path, "a", newline="") as file, ProcessPoolExecutor(max_workers=workers) as pool:
+        writer = csv.DictWriter(file, fieldnames=FIELDS)
+        if new_file:
+            writer.writeheader()
+        futures = [pool.submit(run_chunk, chunk, root_entropy, width, generations, init)
+                   for chunk in chunked(pending, chunk_size)]
+        for future in futures:
+            for row in future.result():
+                writer.writerow(row)
+            file.flush()  # each finished chunk is on disk before the next one is waited for
+    return out_path
+
+
+def load_results(path):
+    with open(path, newline="") as file:
+        rows = list(csv.DictReader(file))
+    return sorted(rows, key=job_key)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep Phase VI worldviews, randomness levels and seeds.")
+    parser.add_argument('--models', nargs='+', choices=ca_sim.WORLDVIEWS, default=ca_sim.WORLDVIEWS)
+    parser.add_argument('--randomness', nargs='+', type=float, default=[0.0, 0.05, 0.1])
+    parser.add_argument('--replicates', type=int, default=10, help="seeds per (model, randomness) cell")
+    parser.add_argument('--seed', type=int, default=0, help="root entropy every job stream is spawned from")
+    parser.add_argument('--width', type=int)
+    parser.add_argument('--generations', type=int)
+    parser.add_argument('--init', choices=['center', 'random'], default='center')
+    parser.add_argument('--workers', type=int, help="pool size (default: all cores)")
+    parser.add_argument('--chunk-size', type=int, help="jobs per task sent to a worker")
+    parser.add_argument('--out', default='sweep_results.csv')
+    args = parser.parse_args(argv)
+
+    jobs = build_jobs(args.models, args.randomness, args.replicates)
+    try:
+        run_sweep(jobs, args.out, args.seed, args.width, args.generations, args.init, args.workers, args.chunk_size)
+    except ValueError as error:
+        parser.error(str(error))
+    print(f"{len(load_results(args.out))} of {len(jobs)} jobs in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import argparse
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import ca_render
+
+"""
+Exhaustive scanner for the 2187 three-state totalistic rules of example3state.py.
+
+A rule number is seven base-3 digits, digit s (most significant first) being the new state of a
+cell whose neighborhood sums to s. A chunk of rules is evolved together as one (rules, steps, width)
+tensor: every generation is one gather into the stacked 7-entry tables. Edge cells stay 0 like in
+evolve_totalistic_ca. Chunks run on a process pool and every rule is reduced to a few numbers:
+
+    density     share of non-zero cells in the final row
+    transient   first generation of the first repeated row, -1 if no row repeats within the run
+    period      generations between the two repeats (1 = fixed point), 0 if none
+    entropy     Shannon entropy in bits of the 3-cell blocks of the final row (0 .. log2 27)
+    class       'extinct', 'fixed', 'periodic' or 'aperiodic'
+
+The results go into an SQLite table, so picking rules is a WHERE clause, and thumbnails are only
+rendered for the rules a query selects:
+
+    python ca_totalistic.py scan --out totalistic.db
+    python ca_totalistic.py query totalistic.db "class = 'aperiodic' AND density > 0.3" \\
+        --order "entropy DESC" --limit 12 --thumbnails thumbs
+"""
+NUM_RULES = 3 ** 7
+SUM_RANGE = 7  # neighborhood sums 0..6
+COLUMNS = ['rule', 'width', 'steps', 'init', 'digits', 'density', 'share_0', 'share_1', 'share_2',
+           'transient', 'period', 'entropy', 'class']
+SCHEMA = """CREATE TABLE IF NOT EXISTS rules (
+    rule INTEGER, width INTEGER, steps INTEGER, init TEXT, digits TEXT,
+    density REAL, share_0 REAL, share_1 REAL, share_2 REAL,
+    transient INTEGER, period INTEGER, entropy REAL, class TEXT,
+    PRIMARY KEY (rule, width, steps, init))"""
+THUMBNAIL_SIZE = (360, 240)
+
+
+def rule_tables(rule_numbers):
+    # (rules, 7) lookup tables, same digits as generate_totalistic_direct_rule
+    numbers = np.asarray(rule_numbers, dtype=np.int64)[:, None]
+    powers = 3 ** np.arange(SUM_RANGE - 1, -1, -1)
+    return ((numbers // powers) % 3).astype(np.uint8)
+
+
+def initial_state(width, init='center', seed=None):
+    if init == 'center':
+        row = np.zeros(width, dtype=np.uint8)
+        row[width // 2] = 1  # single seed at center, as in example3state.py
+        return row
+    if init == 'random':
+        return np.random.default_rng(seed).integers(0, 3, size=width, dtype=np.uint8)
+    raise ValueError(f"unknown init {init!r}, expected 'center' or 'random'")
+
+
+def evolve_batch(initial_row, tables, steps):
+    # (rules, steps, width) histories of every rule from the same initial row
+    tables = np.asarray(tables, dtype=np.uint8)
+    row = np.asarray(initial_row, dtype=np.uint8)
+    history = np.zeros((len(tables), steps, row.shape[-1]), dtype=np.uint8)
+    if steps == 0:
+        return history
+    history[:, 0] = row
+    offsets = (np.arange(len(tables)) * SUM_RANGE)[:, None]  # each rule gathers from its own table
+    flat = tables.ravel()
+    for t in range(1, steps):
+        prev = history[:, t - 1]
+        sums = prev[:, :-2] + prev[:, 1:-1] + prev[:, 2:]
+        history[:, t, 1:-1] = flat[sums + offsets]
+    return history
+
+
+def row_hashes(history):
+    # 64-bit fingerprint per row (wrapping dot product with fixed odd weights); equal rows always
+    # share one, the rare collision is ruled out by comparing the rows themselves
+    weights = np.random.default_rng(0x70714).integers(1, 2 ** 63, size=history.shape[-1], dtype=np.uint64) | 1
+    return (history.astype(np.uint64) * weights).sum(axis=-1, dtype=np.uint64)
+
+
+def first_repeat(history, hashes):
+    # (transient, period) of the first repeated row of one history, (-1, 0) if there is none
+    seen = {}
+    for t, key in enumerate(hashes.tolist()):
+        for s in seen.setdefault(key, []):
+            if np.array_equal(history[s], history[t]):
+                return s, t - s
+        seen[key].append(t)
+    return -1, 0
+
+
+def block_entropy(rows):
+    # (rules, width) -> entropy in bits of the 3-cell block frequencies of each row
+    rows = np.asarray(rows, dtype=np.int64)
+    n = rows.shape[0]
+    codes = 9 * rows[:, :-2] + 3 * rows[:, 1:-1] + rows[:, 2:] + (np.arange(n) * 27)[:, None]
+    counts = np.bincount(codes.ravel(), minlength=n * 27).reshape(n, 27).astype(float)
+    p = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return -np.where(p > 0, p * np.log2(p), 0.0).sum(axis=1)
+
+
+def classify(density, period):
+    if density == 0:
+        return 'extinct'
+    if period == 1:
+        return 'fixed'
+    return 'periodic' if period else 'aperiodic'
+
+
+def scan_chunk(rule_numbers, width, steps, init='center', seed=None):
+    tables = rule_tables(rule_numbers)
+    history = evolve_batch(initial_state(width, init, seed), tables, steps)
+    final = history[:, -1]
+    shares = np.stack([(final == s).mean(axis=1) for s in range(3)], axis=1)
+    entropy = block_entropy(final)
+    hashes = row_hashes(history)
+    results = []
+    for i, rule in enumerate(rule_numbers):
+        transient, period = first_repeat(history[i], hashes[i])
+        density = float(1 - shares[i, 0])
+        results.append({'rule': int(rule), 'width': width, 'steps': steps, 'init': init,
+                        'digits': ''.join(map(str, tables[i])), 'density': density,
+                        'share_0': float(shares[i, 0]), 'share_1': float(shares[i, 1]),
+                        'share_2': float(shares[i, 2]), 'transient': transient, 'period': period,
+                        'entropy': float(entropy[i]), 'class': classify(density, period)})
+    return results
+
+
+def connect(path):
+    db = sqlite3.connect(path)
+    db.execute(SCHEMA)
+    return db
+
+
+def scanned_rules(db, width, steps, init):
+    rows = db.execute("SELECT rule FROM rules WHERE width = ? AND steps = ? AND init = ?", (width, steps, init))
+    return {rule for (rule,) in rows}
+
+
+def run_scan(out_path, rule_numbers=range(NUM_RULES), width=121, steps=300, init='center', seed=None,
+             workers=None, chunk_size=64):
+    # Rules already in the table for the same width, steps and init are skipped, so a scan resumes
+    db = connect(out_path)
+    done = scanned_rules(db, width, steps, init)
+    pending = [rule for rule in rule_numbers if rule not in done]
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    insert = f"INSERT OR REPLACE INTO rules ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        futures = [pool.submit(scan_chunk, chunk, width, steps, init, seed) for chunk in chunks]
+        for future in futures:
+            db.executemany(insert, [[row[c] for c in COLUMNS] for row in future.result()])
+            db.commit()  # each finished chunk is on disk before the next one is waited for
+    db.close()
+    return out_path
+
+
+def query(path, where=None, order='rule', limit=None):
+    # Rows of the results table as dicts, e.g. query(db, "period > 1", "entropy DESC", 10)
+    db = connect(path)
+    db.row_factory = sqlite3.Row
+    sql = "SELECT * FROM rules" + (f" WHERE {where}" if where else "") + f" ORDER BY {order}"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    rows = [dict(row) for row in db.execute(sql)]
+    db.close()
+    return rows
+
+
+def render_thumbnails(rule_numbers, out_dir, width=121, steps=300, init='center', seed=None,
+                      max_size=THUMBNAIL_SIZE):
+    # Evolves only the selected rules and writes one PNG per rule, white/gray/black like example3state.py
+    os.makedirs(out_dir, exist_ok=True)
+    rule_numbers = list(rule_numbers)
+    history = evolve_batch(initial_state(width, init, seed), rule_tables(rule_numbers), steps)
+    paths = []
+    for rule, states in zip(rule_numbers, history):
+        zoom, stride = ca_render.fit_scale(states.shape, max_size)
+        path = os.path.join(out_dir, f"Totalistic3State_Rule{rule}.png")
+        paths.append(ca_render.write_png(path, states, ca_render.TOTALISTIC_PALETTE, zoom, stride))
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scan, query and draw the 2187 3-state totalistic rules.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    settings = argparse.ArgumentParser(add_help=False)
+    settings.add_argument('--width', type=int, default=121)
+    settings.add_argument('--steps', type=int, default=300)
+    settings.add_argument('--init', choices=['center', 'random'], default='center')
+    settings.add_argument('--seed', type=int, help="seed for --init random")
+
+    scan = sub.add_parser('scan', parents=[settings], help="evolve and classify every rule")
+    scan.add_argument('--out', default='totalistic.db')
+    scan.add_argument('--workers', type=int, help="pool size (default: all cores)")
+    scan.add_argument('--chunk-size', type=int, default=64, help="rules evolved together per task")
+
+    select = sub.add_parser('query', parents=[settings], help="list rules matching an SQL condition")
+    select.add_argument('db')
+    select.add_argument('where', nargs='?', help="e.g. \"class = 'aperiodic' AND density > 0.3\"")
+    select.add_argument('--order', default='rule')
+    select.add_argument('--limit', type=int)
+    select.add_argument('--thumbnails', metavar='DIR', help="render the selected rules into DIR")
+
+    thumbs = sub.add_parser('thumbs', parents=[settings], help="render the given rules")
+    thumbs.add_argument('rules', nargs='+', type=int)
+    thumbs.add_argument('--out-dir', default='thumbnails')
+    args = parser.parse_args(argv)
+
+    if args.command == 'scan':
+        run_scan(args.out, range(NUM_RULES), args.width, args.steps, args.init, args.seed, args.workers,
+                 args.chunk_size)
+        print(f"{len(query(args.out))} rules in {args.out}")
+    elif args.command == 'query':
+        where = f"width = {args.width} AND steps = {args.steps} AND init = '{args.init}'"
+        rows = query(args.db, f"{where} AND ({args.where})" if args.where else where, args.order, args.limit)
+        print(f"{'rule':>5} {'digits':>8} {'class':>10} {'density':>8} {'period':>7} {'entropy':>8}")
+        for row in rows:
+            print(f"{row['rule']:>5} {row['digits']:>8} {row['class']:>10} {row['density']:>8.3f} "
+                  f"{row['period']:>7} {row['entropy']:>8.3f}")
+        if args.thumbnails:
+            render_thumbnails([row['rule'] for row in rows], args.thumbnails, args.width, args.steps,
+                              args.init, args.seed)
+    else:
+        for path in render_thumbnails(args.rules, args.out_dir, args.width, args.steps, args.init, args.seed):
+            print(path)
+
+
+if __name__ == "__main__":
+    main()
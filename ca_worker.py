@@ -0,0 +1,186 @@
+import queue
+import threading
+import time
+import tkinter as tk
+from tkinter import filedialog, messagebox
+import numpy as np
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import ca_profile
+import ca_render
+import ca_sim
+import ca_stats
+
+"""
+Background simulation runs with progressive rendering for the CAApp windows.
+
+The engine (ca_sim.iter_blocks) runs in a worker thread and puts each finished block of rows on a
+queue. The Tk main thread polls that queue with master.after, so the window never freezes: the CA
+image fills in top to bottom, the distribution chart grows as generations finish, and a Cancel
+button stops the worker between blocks. Tk is only ever touched from the main thread.
+
+Every stage is timed with a ca_profile.Profiler: the engine per block (in the worker thread),
+collecting the block, the image, the chart (draw_chart, i.e. display_ca) and the canvas draw. The
+totals, cells/second and peak memory are shown in a status line under the run, and "Save Profile"
+writes the trace file.
+"""
+POLL_MS = 50
+REDRAW_SECONDS = 0.1  # image and chart are redrawn at most this often while blocks arrive
+BLOCK_SIZE = 16
+PENDING = 3  # history value for rows not computed yet, drawn in light gray
+PENDING_PALETTE = np.vstack([ca_render.PALETTE, [[225, 225, 225]]]).astype(np.uint8)
+
+
+class SimulationWorker(threading.Thread):
+    def __init__(self, params, block_size=BLOCK_SIZE, profiler=None):
+        super().__init__(daemon=True)
+        self.params = params
+        self.block_size = block_size
+        self.profiler = profiler
+        self.blocks = queue.Queue()
+        self.cancelled = threading.Event()
+
+    def run(self):
+        try:
+            blocks = ca_sim.iter_blocks(**self.params, block_size=self.block_size)
+            if self.profiler is not None:
+                blocks = self.profiler.wrap_blocks(blocks)
+            for block in blocks:
+                if self.cancelled.is_set():
+                    self.blocks.put(('cancelled', None))
+                    return
+                self.blocks.put(('block', block))
+            self.blocks.put(('done', None))
+        except Exception as err:  # handed to the main thread, which owns the error dialog
+            self.blocks.put(('error', err))
+
+    def cancel(self):
+        self.cancelled.set()
+
+
+class ProgressiveRun:
+    # Fills `frame` with title, image, progress line, Cancel button and (optionally) the chart drawn
+    # by draw_chart(stats, fig) -> fig, then streams a run into them. on_done(result) gets the
+    # same dict as ca_sim.run when the run finishes (not when it is cancelled). The profiler
+    # defaults to ca_profile.Profiler.from_environment().
+    def __init__(self, master, frame, params, title, draw_chart=None, on_done=None, block_size=BLOCK_SIZE,
+                 profiler=None):
+        self.master = master
+        self.params = params
+        self.draw_chart = draw_chart
+        self.chart_name = getattr(draw_chart, '__name__', 'chart')
+        self.profiler = (ca_profile.Profiler.from_environment() if profiler is None else profiler).start()
+        self.on_done = on_done
+        self.generations = params['generations']
+        width = len(params['initial_row'])
+
+        self.history = np.full((self.generations, width), PENDING, dtype=np.uint8)
+        self.collector = ca_sim.HistoryCollector(self.generations, width, keep_reasons=True)
+        self.stats = ca_stats.RunStatistics()
+        self.done_rows = 0
+        self.last_redraw = 0.0
+        self.finished = False
+        self.detached = False
+
+        for widget in frame.winfo_children():
+            widget.destroy()
+        self.view = ca_render.show_history(frame, self.history, title, palette=PENDING_PALETTE)
+        self.view.pack()
+        status = tk.Frame(frame)
+        status.pack()
+        self.progress = tk.Label(status, text=f"Generation 0 / {self.generations}")
+        self.progress.pack(side='left', padx=5)
+        self.cancel_btn = tk.Button(status, text="Cancel", command=self.cancel)
+        self.cancel_btn.pack(side='left', padx=5)
+        tk.Button(status, text="Save Profile", command=self.save_profile).pack(side='left', padx=5)
+        self.profile_line = tk.Label(frame, text="", fg='gray30')
+        self.profile_line.pack()
+        self.fig = None
+        self.canvas = None
+        if draw_chart is not None:
+            self.fig = draw_chart(self.stats, None)
+            self.canvas = FigureCanvasTkAgg(self.fig, master=frame)
+            self.canvas.get_tk_widget().pack()
+
+        self.worker = SimulationWorker(params, block_size, self.profiler)
+        self.worker.start()
+        self.master.after(POLL_MS, self.poll)
+
+    def cancel(self):
+        self.worker.cancel()
+        self.cancel_btn.configure(state=tk.DISABLED)
+
+    def detach(self):
+        # Stop the worker and never touch the widgets again, e.g. before a new run clears the frame
+        self.worker.cancel()
+        self.profiler.stop()
+        self.detached = True
+
+    def save_profile(self):
+        path = filedialog.asksaveasfilename(defaultextension='.json', initialfile='ca_profile.json',
+                                            filetypes=[("Trace JSON", "*.json")])
+        if path:
+            self.profiler.write_trace(path)
+
+    def poll(self):
+        if self.detached:
+            return
+        status = None
+        try:
+            while True:
+                kind, payload = self.worker.blocks.get_nowait()
+                if kind != 'block':
+                    status = (kind, payload)
+                    break
+                self.add_block(payload)
+        except queue.Empty:
+            pass
+
+        if status is not None or time.monotonic() - self.last_redraw >= REDRAW_SECONDS:
+            self.redraw()
+        if status is None:
+            self.master.after(POLL_MS, self.poll)
+            return
+
+        self.cancel_btn.configure(state=tk.DISABLED)
+        self.profiler.stop()
+        self.profile_line.configure(text=self.profiler.status_line())
+        kind, payload = status
+        if kind == 'error':
+            self.progress.configure(text=f"Stopped at generation {self.done_rows}: {payload}")
+            messagebox.showerror("Simulation failed", str(payload))
+        elif kind == 'cancelled':
+            self.progress.configure(text=f"Cancelled at generation {self.done_rows} / {self.generations}")
+        else:
+            self.finished = True
+            done = f"Done: {self.collector.filled} generations"
+            if self.params.get('on_cycle'):
+                done += f", {ca_sim.describe_cycle(self.collector.cycle)}"
+            self.progress.configure(text=done)
+            if self.on_done is not None:
+                self.on_done({'history': self.collector.history[:self.collector.filled],
+                              'rules': self.params['rules'], 'randomness_level': self.params.get('randomness_level', 0.0),
+                              'transitions': self.collector.transitions,
+                              'stats': self.stats, 'reasons': self.collector.reason_plane(),
+                              'cycle': self.collector.cycle})
+
+    def add_block(self, block):
+        with self.profiler.timer('collect'):
+            start, rows = block['start'], block['rows']
+            self.history[start:start + len(rows)] = rows
+            self.collector.update(block)
+            self.stats.update(block)
+            self.done_rows = start + len(rows)
+
+    def redraw(self):
+        self.last_redraw = time.monotonic()
+        with self.profiler.timer('image'):
+            zoom, stride = ca_render.fit_scale(self.history.shape)
+            pixels = ca_render.to_rgb(self.history, PENDING_PALETTE, zoom, stride)
+            self.view.image_label.image.configure(data=ca_render.to_ppm(pixels), format='PPM')
+        self.progress.configure(text=f"Generation {self.done_rows} / {self.generations}")
+        if self.draw_chart is not None and self.done_rows:
+            with self.profiler.timer(self.chart_name):
+                self.draw_chart(self.stats, self.fig)
+            with self.profiler.timer('canvas.draw'):  # drawn now rather than draw_idle, so it can be timed
+                self.canvas.draw()
+        self.profile_line.configure(text=self.profiler.status_line())
@@ -49,7 +49,7 @@ def plot_totalistic_ca(ca, rule_number):
 if __name__ == '__main__':
     width = 121  # Odd number for symmetry
     steps = 300
-    rule_number = 1077  # Try others like 1062, 1749, etc.
+    rule_number = 1077  # Try others like 1062, 1749, etc. (ca_totalistic.py scans and classifies all 2187)
 
     initial_state = np.zeros(width, dtype=int)
     initial_state[width // 2] = 1  # Single seed at center
@@ -0,0 +1,50 @@
+import os
+import numpy as np
+import pytest
+import ca_checkpoint
+import ca_history
+import ca_sim
+
+
+class Interrupted(Exception):
+    pass
+
+
+class StopAt:
+    # Consumer that kills the run once generation `at` is reached, like a crash mid-run
+    def __init__(self, at):
+        self.at = at
+
+    def update(self, block):
+        if block['start'] >= self.at:
+            raise Interrupted
+
+
+def params(phase='VI', **overrides):
+    return ca_sim.prepare(phase, width=301, generations=120, seed=4, init='random', **overrides)
+
+
+@pytest.mark.parametrize('phase', ['III', 'V', 'VI'])
+def test_resume_matches_uninterrupted_run(tmp_path, phase):
+    full = ca_sim.run(**params(phase), keep_reasons=True)
+    history, checkpoint = str(tmp_path / 'run.cahist'), str(tmp_path / 'run.ckpt.npz')
+    reasons = str(tmp_path / 'reasons.cahist') if phase == 'V' else None
+    with pytest.raises(Interrupted):
+        ca_checkpoint.run_checkpointed(params(phase), history, checkpoint, every=20, reasons_path=reasons,
+                                       block_size=10, consumers=[StopAt(70)])
+    assert os.path.exists(checkpoint) and ca_history.HistoryReader(history).generations < 120
+    stats = ca_checkpoint.run_checkpointed(params(phase), history, checkpoint, every=20, reasons_path=reasons,
+                                           block_size=10)
+    np.testing.assert_array_equal(ca_history.HistoryReader(history).rows(), full['history'])
+    if reasons:
+        np.testing.assert_array_equal(ca_history.HistoryReader(reasons).rows(), full['reasons'])
+    np.testing.assert_array_equal(stats.last_row, full['stats'].last_row)
+
+
+def test_resume_refuses_other_parameters(tmp_path):
+    history, checkpoint = str(tmp_path / 'run.cahist'), str(tmp_path / 'run.ckpt.npz')
+    with pytest.raises(Interrupted):
+        ca_checkpoint.run_checkpointed(params(), history, checkpoint, every=20, block_size=10,
+                                       consumers=[StopAt(50)])
+    with pytest.raises(ValueError):
+        ca_checkpoint.run_checkpointed(params(randomness_level=0.5), history, checkpoint, every=20, block_size=10)
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+import ca_delta
+import ca_history
+
+
+def slow_rows(generations, width, seed=0):
+    # Mostly unchanged rows with a few cells flipped per generation, like a low-randomness run
+    rng = np.random.default_rng(seed)
+    rows = np.empty((generations, width), dtype=np.uint8)
+    rows[0] = rng.integers(0, 3, width)
+    for t in range(1, generations):
+        rows[t] = rows[t - 1]
+        cells = rng.integers(0, width, int(rng.integers(0, 4)))
+        rows[t, cells] = rng.integers(0, 3, len(cells))
+    return rows
+
+
+@pytest.mark.parametrize('width', [1, 13, 300])
+@pytest.mark.parametrize('keyframe_every', [1, 4, 256])
+def test_round_trip(tmp_path, width, keyframe_every):
+    rows = slow_rows(50, width)
+    path = str(tmp_path / 'rows.cadelta')
+    with ca_delta.DeltaWriter(path, width, keyframe_every=keyframe_every) as writer:
+        for start in range(0, len(rows), 7):
+            writer.update({'rows': rows[start:start + 7]})
+    reader = ca_delta.DeltaReader(path)
+    assert reader.generations == len(rows)
+    np.testing.assert_array_equal(reader.rows(), rows)
+
+
+@pytest.mark.parametrize('start, stop', [(0, 1), (3, 4), (3, 9), (7, 40), (45, 50), (10, 10), (20, None)])
+def test_range_reads(tmp_path, start, stop):
+    rows = slow_rows(50, 37)
+    path = str(tmp_path / 'rows.cadelta')
+    with ca_delta.DeltaWriter(path, 37, keyframe_every=4) as writer:  # chunks of 4 rows, ranges cross them
+        writer.append(rows)
+    np.testing.assert_array_equal(ca_delta.DeltaReader(path).rows(start, stop), rows[start:stop])
+
+
+def test_compressed_history_in_memory():
+    rows = slow_rows(30, 64)
+    history = ca_delta.CompressedHistory(64, keyframe_every=8)
+    history.update({'rows': rows})
+    assert history.nbytes < rows.size // 4
+    np.testing.assert_array_equal(history.reader().rows(5, 21), rows[5:21])
+
+
+def test_compress_keeps_rows_and_header(tmp_path):
+    rows = slow_rows(40, 25)
+    history = ca_history.save_history(str(tmp_path / 'rows.cahist'), rows, bits=2, phase='V', randomness_level=0.01)
+    reader = ca_delta.DeltaReader(ca_delta.compress(history, str(tmp_path / 'rows.cadelta'), keyframe_every=16))
+    np.testing.assert_array_equal(reader.rows(), rows)
+    assert reader.header['phase'] == 'V' and reader.header['randomness_level'] == 0.01
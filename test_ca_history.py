@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+import ca_history
+
+
+@pytest.mark.parametrize('bits', [2, 8])
+@pytest.mark.parametrize('width', [1, 7, 8, 101])
+def test_zero_row_round_trip(tmp_path, bits, width):
+    path = str(tmp_path / 'empty.cahist')
+    ca_history.save_history(path, np.zeros((0, width), dtype=np.uint8), bits=bits)
+    reader = ca_history.HistoryReader(path)
+    assert reader.generations == 0
+    assert reader.rows().shape == (0, width)
+
+
+def test_pack_2bit_zero_rows():
+    packed = ca_history.pack_2bit(np.zeros((0, 9), dtype=np.uint8))
+    assert packed.shape == (0, ca_history.row_bytes(9, 2))
+    assert ca_history.unpack_2bit(packed, 9).shape == (0, 9)
+
+
+def test_round_trip(tmp_path):
+    rows = np.random.default_rng(0).integers(0, 3, size=(5, 13), dtype=np.uint8)
+    path = ca_history.save_history(str(tmp_path / 'rows.cahist'), rows, bits=2)
+    np.testing.assert_array_equal(ca_history.HistoryReader(path).rows(), rows)
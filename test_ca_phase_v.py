@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+import ca_engine
+import ca_history
+import ca_sim
+
+
+def reference_phase_v(row, rules):
+    # Phase V's original per-cell update: inheritance, then intervention, then the rule
+    padded = [0] + list(row) + [0]
+    states, reasons = [], []
+    for left, center, right in zip(padded, padded[1:], padded[2:]):
+        if center < 2 and left == 2 and right == 2:
+            states.append(center + 1)
+            reasons.append(ca_engine.REASON_INHERITANCE)
+        elif center > 0 and left == 0 and right == 0:
+            states.append(center - 1)
+            reasons.append(ca_engine.REASON_INTERVENTION)
+        else:
+            states.append(rules.get((left, center, right), center))
+            reasons.append(ca_engine.REASON_RULE)
+    return states, reasons
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_reasons_match_per_cell_loop(seed):
+    row = np.random.default_rng(seed).integers(0, 3, 97).astype(np.uint8)
+    nxt, reasons = ca_engine.phase_v_step(row, ca_engine.as_table(ca_sim.DEFAULT_RULES))
+    states, expected = reference_phase_v(row.tolist(), ca_sim.DEFAULT_RULES)
+    np.testing.assert_array_equal(nxt, states)
+    np.testing.assert_array_equal(reasons, expected)
+
+
+def test_random_reasons_mark_changed_cells():
+    row = np.random.default_rng(0).integers(0, 3, 500).astype(np.uint8)
+    table = ca_engine.as_table(ca_sim.DEFAULT_RULES)
+    plain, _ = ca_engine.phase_v_step(row, table)
+    streams = ca_engine.CellStreams.from_rng(np.random.default_rng(1))
+    nxt, reasons = ca_engine.phase_v_step(row, table, streams, 0.2, generation=1)
+    assert (reasons == ca_engine.REASON_RANDOM).any()
+    kept = reasons != ca_engine.REASON_RANDOM
+    np.testing.assert_array_equal(nxt[kept], plain[kept])
+
+
+def test_export_records_the_level_the_run_used(tmp_path, monkeypatch):
+    phase_v = pytest.importorskip('PhaseV_InheritanceIntervention')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(phase_v.messagebox, 'showinfo', lambda *args: None)
+    app = phase_v.CAApp.__new__(phase_v.CAApp)  # no Tk window, only the run and export state
+    app.rules = ca_sim.DEFAULT_RULES.copy()
+    result = ca_sim.run(ca_sim.single_center_row(41, 2), app.rules, 20, 0.05, 'phase_v',
+                        np.random.default_rng(3), keep_reasons=True)
+    app.finish_run(dict(result, randomness_level=0.05))
+    app.export_csv()
+    reader = ca_history.HistoryReader('ca_simulation_export.cahist')
+    assert reader.header['randomness_level'] == 0.05
+    np.testing.assert_array_equal(reader.rows(), result['history'])
+    np.testing.assert_array_equal(ca_history.HistoryReader('ca_simulation_reasons.cahist').rows(), result['reasons'])
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+import ca_shard
+import ca_sim
+
+RANDOM_ROW = ca_sim.random_row(997, np.random.default_rng(1))
+CASES = [
+    (ca_sim.DEFAULT_RULES, 0.0, None),
+    (ca_sim.DEFAULT_RULES, 0.1, None),
+    (ca_sim.DEFAULT_RULES, 0.05, 'phase_v'),
+    (ca_sim.generate_weighted_rule_set('balanced', np.random.default_rng(2)), 0.1, 'phase_vi'),
+    (ca_sim.stochastic_rule_set('optimistic'), 0.1, 'phase_vi'),
+    (ca_sim.stochastic_rule_set('balanced'), 0.0, None),
+]
+
+
+@pytest.mark.parametrize('rules, level, overlay', CASES)
+@pytest.mark.parametrize('workers, halo, block_size', [(3, 1, 16), (4, 5, 7), (2, 3, 1)])
+def test_sharded_matches_single_process(rules, level, overlay, workers, halo, block_size):
+    keep_reasons = overlay == 'phase_v'
+    single = ca_sim.run(RANDOM_ROW, rules, 40, level, overlay, np.random.default_rng(7), keep_reasons)
+    sharded = ca_shard.run_sharded(RANDOM_ROW, rules, 40, level, overlay, np.random.default_rng(7), keep_reasons,
+                                   workers=workers, halo=halo, block_size=block_size)
+    np.testing.assert_array_equal(sharded['history'], single['history'])
+    assert sharded['transitions'] == single['transitions']
+    if keep_reasons:
+        np.testing.assert_array_equal(sharded['reasons'], single['reasons'])
+
+
+def test_random_events_leave_rng_unadvanced():
+    rng = np.random.default_rng(7)
+    ca_shard.run_sharded(RANDOM_ROW, ca_sim.DEFAULT_RULES, 10, 0.1, None, rng, workers=2)
+    assert rng.random() == np.random.default_rng(7).random()